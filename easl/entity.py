@@ -31,6 +31,8 @@ class Entity(object):
     attribute_values : {name: []}
         List of possible values for every attribute.
     sensors : [Sensor]
+    sensor_listeners : [function(Entity, Sensor)]
+        Called whenever a sensor is added.
     observations : {name: value}
     physics : function
         a function that changes the state using only the state's
@@ -65,6 +67,7 @@ class Entity(object):
         self.a = self.attributes
         self.attribute_values = {}
         self.sensors = []
+        self.sensor_listeners = []
         self.observations = {}
         self.physics = lambda x: None
         self.emission = lambda x: []
@@ -209,6 +212,18 @@ class Entity(object):
         sensor.set_observations(self.observations)
         self.sensors.append(sensor)
 
+        for listener in self.sensor_listeners:
+            listener(self, sensor)
+
+    def add_sensor_listener(self, listener):
+        """
+        Parameters
+        ----------
+        listener : function(Entity, Sensor)
+            Called whenever a sensor is added.
+        """
+        self.sensor_listeners.append(listener)
+
     def add_trigger(self, name, trigger):
         """
         A Trigger changes the Entity's internal state if a match for a
@@ -1,74 +1,916 @@
 __author__ = 'Dennis'
 
 import easl
+from easl.utils import Table
 from easl.utils import SparseTable
 from easl.utils import SparseConditionalTable
+from easl.utils import branch_and_bound
+from easl.utils import Factor
 from mechanism import Mechanism
+from structure_learning import SufficientStatistics
+from structure_learning import StructureLearner
 from easl import visualize
 
 import random
-from copy import deepcopy
+import itertools
+import bisect
+import math
+import sys
+from collections import deque
+
+import numpy as np
 
 
 class Data(object):
-    def __init__(self):
-        self.entries = []
+    """
+    History of entries, stored as one column of integer codes per variable.
+
+    The values of a variable are encoded in the order in which they are
+    first seen.
+    Columns are preallocated and grow by doubling; when a capacity is given,
+    only the latest entries are kept in a ring buffer instead.
+    Every entry is then written twice, `capacity` rows apart, so that the
+    kept entries are always a contiguous slice of the column.
+    """
+    MISSING = -1
+
+    def __init__(self, capacity=None):
+        """
+        Parameters
+        ----------
+        capacity : int, optional
+            Maximum number of entries to keep.
+
+        Attributes
+        ----------
+        columns : {string: ndarray}
+            Codes of the values of every variable.
+        values : {string: [string]}
+            For every variable, the values in the order of their codes.
+        codes : {string: {string: int}}
+            Inverted `values`.
+        length : int
+            Number of entries that were added in total.
+        size : int
+            Number of rows in every column.
+        counters : [FrequencyCounter]
+            Counters that are updated with every new entry.
+        """
+        self.capacity = capacity
+
+        self.columns = {}
+        self.values = {}
+        self.codes = {}
+
+        self.length = 0
+        self.size = 16 if capacity is None else 2 * capacity
+
+        self.counters = []
+
+        # Which column, under which node name and lag, is read for previous/current entries
+        self.lags = {}
 
     def add_entry(self, vals):
-        self.entries.append(deepcopy(vals))
+        if self.capacity is None and self.length == self.size:
+            self.__grow()
+
+        for name in vals:
+            if name not in self.columns:
+                self.columns[name] = np.full(self.size, self.MISSING, dtype=np.int32)
+                self.values[name] = []
+                self.codes[name] = {}
+
+        i = self.length if self.capacity is None else self.length % self.capacity
+        for name in self.columns:
+            code = self.__encode(name, vals[name]) if name in vals else self.MISSING
+
+            self.columns[name][i] = code
+            if self.capacity is not None:
+                self.columns[name][i + self.capacity] = code
+
+        self.length += 1
+
+        for counter in self.counters:
+            self.__count(counter, self.last_time())
+
+    def __encode(self, name, value):
+        codes = self.codes[name]
+
+        if value not in codes:
+            codes[value] = len(self.values[name])
+            self.values[name].append(value)
+
+        return codes[value]
+
+    def __grow(self):
+        self.size *= 2
+
+        for name in self.columns:
+            column = np.full(self.size, self.MISSING, dtype=np.int32)
+            column[:self.length] = self.columns[name][:self.length]
+            self.columns[name] = column
+
+    def add_counter(self, counter):
+        """
+        Registers a counter that keeps track of the frequencies of all entries.
+
+        Entries that are still kept are counted immediately.
+
+        Parameters
+        ----------
+        counter : FrequencyCounter
+        """
+        for t in range(self.first_time(), self.length):
+            self.__count(counter, t)
+
+        self.counters.append(counter)
+
+    def __count(self, counter, time):
+        # Only from the third entry on is there a full previous/current entry
+        if time - 2 < self.first_time():
+            return
+
+        counter.add_entry(self.get_entries_previous_current(time, counter.variables.keys(), counter.motor))
+
+    def __row(self, time):
+        if time < 0:
+            time += self.length
+        if not self.first_time() <= time < self.length:
+            raise IndexError("There is no entry at time {0}".format(time))
+
+        return time if self.capacity is None else time % self.capacity
+
+    def __window(self, name):
+        """
+        All kept codes of a variable, from the oldest to the latest entry.
+        """
+        if self.capacity is None or self.length <= self.capacity:
+            return self.columns[name][:self.length]
+
+        start = self.length % self.capacity
+        return self.columns[name][start:start + self.capacity]
+
+    def __get_lags(self, variables, motor):
+        """
+        Returns
+        -------
+        [(string, string, int)]
+            Variable, node name and how many entries before the current one it is read from.
+        """
+        key = (tuple(sorted(variables)), tuple(sorted(motor)), len(self.columns))
+
+        if key not in self.lags:
+            lags = []
+            for x in self.columns:
+                if x in motor:
+                    previous, current = 2, 1
+                else:
+                    previous, current = 1, 0
+
+                if x + CausalLearningMechanism.PREVIOUS in variables:
+                    lags.append((x, x + CausalLearningMechanism.PREVIOUS, previous))
+                if x + CausalLearningMechanism.CURRENT in variables:
+                    lags.append((x, x + CausalLearningMechanism.CURRENT, current))
+
+            self.lags[key] = lags
+
+        return self.lags[key]
 
     def get_entries_at_time(self, time):
-        return self.entries[time]
+        i = self.__row(time)
+
+        return {name: self.values[name][column[i]]
+                for name, column in self.columns.iteritems() if column[i] != self.MISSING}
 
     def get_entries_previous_current(self, time, variables, motor):
-        if time >= len(self.entries) or time - 2 < 0:
+        if time >= self.length or time - 2 < self.first_time():
             return {}
 
-        past = self.entries[time - 2]
-        previous = self.entries[time - 1]
-        current = self.entries[time]
-
-        previous_entries_motor = {x + CausalLearningMechanism.PREVIOUS: y
-                                  for (x, y) in past.iteritems()
-                                  if x in motor and x + CausalLearningMechanism.PREVIOUS in variables}
-        current_entries_motor = {x + CausalLearningMechanism.CURRENT: y
-                                 for (x, y) in previous.iteritems()
-                                 if x in motor and x + CausalLearningMechanism.CURRENT in variables}
-        previous_entries_sensor = {x + CausalLearningMechanism.PREVIOUS: y
-                                   for (x, y) in previous.iteritems()
-                                   if x not in motor and x + CausalLearningMechanism.PREVIOUS in variables}
-        current_entries_sensor = {x + CausalLearningMechanism.CURRENT: y
-                                  for (x, y) in current.iteritems()
-                                  if x not in motor and x + CausalLearningMechanism.CURRENT in variables}
+        rows = [self.__row(time), self.__row(time - 1), self.__row(time - 2)]
 
         entries = {}
-        entries.update(previous_entries_motor)
-        entries.update(current_entries_motor)
-        entries.update(previous_entries_sensor)
-        entries.update(current_entries_sensor)
+        for x, node, lag in self.__get_lags(variables, motor):
+            code = self.columns[x][rows[lag]]
+            if code != self.MISSING:
+                entries[node] = self.values[x][code]
 
         return entries
 
+    def get_columns_previous_current(self, variables, motor):
+        """
+        Previous/current entries of all kept times at once.
+
+        Parameters
+        ----------
+        variables : [string]
+        motor : [string]
+
+        Returns
+        -------
+        columns : {string: ndarray}
+            For every node, the codes at every time from the third kept entry on.
+        values : {string: [string]}
+            For every node, the values in the order of their codes.
+        """
+        columns = {}
+        values = {}
+
+        for x, node, lag in self.__get_lags(variables, motor):
+            window = self.__window(x)
+
+            columns[node] = window[2 - lag:len(window) - lag]
+            values[node] = self.values[x]
+
+        return columns, values
+
+    def first_time(self):
+        if self.capacity is None:
+            return 0
+        else:
+            return max(0, self.length - self.capacity)
+
     def last_time(self):
-        return len(self.entries) - 1
+        return self.length - 1
 
     def get_latest_entry(self, offset=0):
-        return self.entries[-1 - offset]
+        return self.get_entries_at_time(self.last_time() - offset)
+
+
+class FrequencyCounter(object):
+    """
+    Keeps the frequencies of previous/current entries up to date as they are
+    added to a Data, so that distributions can be read from the counts without
+    going over all of the data again.
+
+    Counts can be limited to the latest entries, either by only counting a
+    window of the last N entries, or by decaying all counts by a factor with
+    every new entry.
+    A decay is kept incrementally by letting every new entry weigh more than
+    the previous one instead, which gives the same ratios between counts.
+    Combinations and blocks of which all entries left the window are
+    removed, so that the counts take as much memory however long the run.
+
+    The frequencies can also be approximated in Count-Min sketches of a
+    fixed size instead, if they are not grouped by evidence.
+
+    Attributes
+    ----------
+    variables : {string: [string]}
+    motor : [string]
+    conditioned : [string]
+        Variables that are conditioned on the rest in the conditional view.
+    conditional : {string: [string]}
+        The variables that are not in `conditioned`.
+    freq : SparseTable or CountMinTable
+        Frequencies of all variables.
+    totals : SparseTable or CountMinTable
+        Frequencies of only the `conditional` variables.
+    sketch : (float, float)
+        Error and its probability of the sketches the frequencies are
+        approximated in, or None to count exactly.
+    n : int
+        Number of counted entries.
+    total : number
+        Sum of the weights of the counted entries.
+    version : int
+        Changes whenever the counts change.
+    window : int
+        Number of latest entries that are counted, or None to count all.
+    decay : float
+        Factor by which counts decay with every new entry, or None to not decay.
+    weight : number
+        Weight of the next entry.
+    recent : deque
+        Counted entries within the window.
+    evidence : [string]
+        Variables of which the values are always known when the conditional
+        view is queried, if the counts are also grouped by them.
+    free : {string: [string]}
+        The variables that are not in `evidence`.
+    free_order : [string]
+        Sorted `free`.
+    sparse : bool
+        Whether blocks only hold the combinations that were counted.
+    dtype : type
+        Type of the counts in dense blocks, or None for integers, or floats
+        when decayed; counts are promoted to a wider type when they do not fit.
+    rest_order : [string]
+        Sorted free variables that are not conditional, i.e. not in `total_free`.
+    blocks : {(string): DenseTable} or {(string): {(string): {(string): number}}}
+        For every combination of evidence values, the frequencies of all free
+        variables, or when sparse, of the counted combinations of free
+        variables, grouped by the values of `total_free_order` (a row) and
+        keyed by the values of `rest_order`.
+    total_blocks : {(string): DenseTable} or {(string): {(string): number}}
+        Similar to `blocks`, but for `totals`; when sparse, keyed by rows.
+    samplers : {((string), (string)): ([(string)], [number])}
+        When sparse, for combinations of evidence values and a row, the
+        counted values of `rest_order` with their cumulative counts, to draw
+        from; kept until the counts of the row change.
+    scales : int
+        Number of times all counts were scaled back.
+    """
+    # Weight at which all counts are scaled back, to stay within float range
+    MAX_WEIGHT = 1e64
+
+    def __init__(self, variables, motor, conditioned=None, evidence=None, window=None, decay=None, sparse=False,
+                 dtype=None, sketch=None):
+        if window is not None and decay is not None:
+            raise RuntimeError("Counts can either be windowed or decayed, not both.")
+        if sketch is not None and evidence is not None:
+            raise RuntimeError("Sketched counts can not be grouped by evidence.")
+
+        self.variables = variables
+        self.motor = motor
+        self.conditioned = [] if conditioned is None else conditioned
+
+        self.conditional = {k: v for k, v in variables.iteritems() if k not in self.conditioned}
+
+        self.sketch = sketch
+        make_table = SparseTable
+        if sketch is not None:
+            make_table = lambda x: easl.utils.CountMinTable(x, *sketch)
+
+        self.freq = make_table(variables)
+        self.totals = None
+        if len(self.conditioned) > 0:
+            self.totals = make_table(self.conditional)
+
+        self.n = 0
+        self.total = 0
+        self.version = 0
+
+        self.window = window
+        self.decay = decay
+        self.weight = 1
+        self.recent = deque()
+
+        self.joint = None
+        self.joint_version = None
+
+        self.evidence = None
+        self.free = None
+        self.free_order = None
+        self.rest_order = None
+        self.sparse = sparse
+        self.dtype = dtype
+        if dtype is None:
+            self.dtype = np.int64 if decay is None else float
+        self.blocks = None
+        self.total_evidence = None
+        self.total_free = None
+        self.total_free_order = None
+        self.total_blocks = None
+        self.samplers = None
+        self.scales = 0
+        if evidence is not None and self.totals is not None:
+            self.evidence = sorted(x for x in evidence if x in variables)
+            self.free = {k: v for k, v in variables.iteritems() if k not in self.evidence}
+            self.free_order = sorted(self.free)
+            self.blocks = {}
+
+            self.total_evidence = [x for x in self.evidence if x in self.conditional]
+            self.total_free = {k: v for k, v in self.conditional.iteritems() if k not in self.evidence}
+            self.total_free_order = sorted(self.total_free)
+            self.total_blocks = {}
+
+            self.rest_order = [x for x in self.free_order if x not in self.total_free]
+            self.samplers = {}
+
+    def add_entry(self, entry):
+        self.__add(entry, self.weight)
+        self.n += 1
+
+        if self.window is not None:
+            self.recent.append(entry)
+
+            if len(self.recent) > self.window:
+                self.__add(self.recent.popleft(), -1)
+                self.n -= 1
+        elif self.decay is not None:
+            self.weight /= float(self.decay)
+
+            if self.weight > self.MAX_WEIGHT:
+                self.__scale(1 / self.weight)
+
+        self.version += 1
+
+    def __add(self, entry, amount):
+        if self.sketch is not None:
+            self.freq.add_value(entry, amount)
+            if self.totals is not None:
+                self.totals.add_value(entry, amount)
+        else:
+            self.__add_count(self.freq.table, self.freq.key(entry), amount)
+            if self.totals is not None:
+                self.__add_count(self.totals.table, self.totals.key(entry), amount)
+
+        if self.blocks is not None:
+            key = tuple(entry[x] for x in self.evidence)
+            total_key = tuple(entry[x] for x in self.total_evidence)
+
+            if self.sparse:
+                row = tuple(entry[x] for x in self.total_free_order)
+
+                self.__add_nested(self.blocks, [key, row, tuple(entry[x] for x in self.rest_order)], amount)
+                self.__add_nested(self.total_blocks, [total_key, row], amount)
+
+                self.samplers.pop((key, row), None)
+            else:
+                self.__add_dense(self.blocks, key, self.free, entry, amount)
+                self.__add_dense(self.total_blocks, total_key, self.total_free, entry, amount)
+
+        self.total += amount
+
+    def __add_dense(self, blocks, key, free, entry, amount):
+        if key not in blocks:
+            blocks[key] = easl.utils.DenseTable(free, dtype=self.dtype)
+        blocks[key].add_value(entry, amount)
+
+        # Blocks of evidence that left the window are not kept
+        if amount < 0 and not blocks[key].table.any():
+            del blocks[key]
+
+    @staticmethod
+    def __add_nested(counts, keys, amount):
+        """
+        Adds to a count in nested dicts, of which the dicts that no longer
+        hold any counts are removed.
+        """
+        if len(keys) == 1:
+            FrequencyCounter.__add_count(counts, keys[0], amount)
+            return
+
+        nested = counts.setdefault(keys[0], {})
+        FrequencyCounter.__add_nested(nested, keys[1:], amount)
+
+        if len(nested) == 0:
+            del counts[keys[0]]
+
+    @staticmethod
+    def __add_count(counts, key, amount):
+        count = counts.get(key, 0) + amount
+
+        # Combinations that left the window are not kept
+        if count == 0:
+            counts.pop(key, None)
+        else:
+            counts[key] = count
+
+    def __scale(self, factor):
+        """
+        Multiplies all counts and weights by the same factor.
+        """
+        self.freq.do_operation(lambda x: x * factor)
+        if self.totals is not None:
+            self.totals.do_operation(lambda x: x * factor)
+
+        if self.blocks is not None and self.sparse:
+            for counts in [row for block in self.blocks.itervalues() for row in block.itervalues()] + \
+                    self.total_blocks.values():
+                for combination in counts:
+                    counts[combination] *= factor
+
+            self.samplers = {}
+        elif self.blocks is not None:
+            for block in self.blocks.values() + self.total_blocks.values():
+                # Counts of a narrow integer type become floats; blocks without free variables stay arrays
+                block.table = np.asarray(block.table * factor)
+
+        self.total *= factor
+        self.weight *= factor
+        self.scales += 1
+
+    def get_sampler(self, key, row):
+        """
+        Parameters
+        ----------
+        key : (string)
+            Values of the evidence variables.
+        row : (string)
+            Values of the variables of `total_free_order`.
+
+        Returns
+        -------
+        rests : [(string)]
+            Counted values of the variables of `rest_order` in the row.
+        cumulative : [number]
+            Cumulative counts of `rests`, to draw them in proportion to their
+            counts by bisection.
+
+        None if nothing was counted in the row.
+        """
+        if not self.sparse:
+            raise RuntimeError("Counts are not grouped by evidence in sparse blocks.")
+
+        if (key, row) not in self.samplers:
+            counts = self.blocks.get(key, {}).get(row)
+            if counts is None:
+                return None
+
+            rests = counts.keys()
+            cumulative = []
+            total = 0
+            for rest in rests:
+                total += counts[rest]
+                cumulative.append(total)
+
+            self.samplers[(key, row)] = (rests, cumulative)
+
+        return self.samplers[(key, row)]
+
+    def get_joint(self):
+        """
+        Returns
+        -------
+        Distribution
+            Joint probability distribution of the counted entries.
+            Only recalculated when the counts changed since the last call.
+        """
+        if self.sketch is not None:
+            raise RuntimeError("Sketched counts can not be enumerated.")
+
+        if self.joint is None or self.joint_version != self.version:
+            freq = easl.utils.Distribution(self.variables, self.freq)
+            if self.total > 0:
+                total = self.total
+                freq.do_operation(lambda x: x / float(total))
+
+            self.joint = freq
+            self.joint_version = self.version
+
+        return self.joint
+
+    def memory_report(self):
+        """
+        Returns
+        -------
+        {string: int}
+            Size in bytes of the frequencies, the blocks and the window.
+        """
+        report = {"freq": self.freq.nbytes(),
+                  "recent": sys.getsizeof(self.recent) + sum(sys.getsizeof(entry) for entry in self.recent)}
+
+        if self.totals is not None:
+            report["totals"] = self.totals.nbytes()
+
+        if self.blocks is not None and self.sparse:
+            report["blocks"] = self.__nested_nbytes(self.blocks)
+            report["total_blocks"] = self.__nested_nbytes(self.total_blocks)
+            report["samplers"] = self.__nested_nbytes(self.samplers)
+        elif self.blocks is not None:
+            for name, blocks in [("blocks", self.blocks), ("total_blocks", self.total_blocks)]:
+                report[name] = sys.getsizeof(blocks) + sum(block.nbytes() for block in blocks.itervalues())
+
+        return report
+
+    @staticmethod
+    def __nested_nbytes(container):
+        """
+        Size in bytes of nested dicts and lists, with their keys and values,
+        not counting the values of the variables within keys and rows, which
+        are shared with the domains.
+        """
+        size = sys.getsizeof(container)
+
+        if isinstance(container, dict):
+            for key, value in container.iteritems():
+                size += sys.getsizeof(key) + FrequencyCounter.__nested_nbytes(value)
+        elif isinstance(container, (list, tuple)):
+            for value in container:
+                size += FrequencyCounter.__nested_nbytes(value) if isinstance(value, list) else sys.getsizeof(value)
+
+        return size
+
+    def nbytes(self):
+        return sum(self.memory_report().values())
+
+    def get_conditional(self):
+        """
+        Returns
+        -------
+        ConditionalFrequencyView
+            Conditional probability table of `conditioned` given the other variables.
+        """
+        if self.totals is None:
+            raise RuntimeError("No conditioned variables.")
+
+        return ConditionalFrequencyView(self)
+
+
+class ConditionalFrequencyView(Table):
+    """
+    Conditional probability table that reads its values from the counts of a
+    FrequencyCounter when they are requested.
+
+    The view always reflects the latest counts, so it never has to be rebuilt.
+    """
+    def __init__(self, counter):
+        super(ConditionalFrequencyView, self).__init__(counter.variables)
+
+        self.counter = counter
+
+    def get_value(self, row):
+        # P(M|R) = F(M&R) / F(R)
+        f_r = float(self.counter.totals.get_value(row))
+        if f_r == 0:
+            return 0
+
+        # Sketched counts are overestimated, the ratio of the two may be too
+        return min(1.0, self.counter.freq.get_value(row) / f_r)
+
+    def set_value(self, row, value):
+        raise RuntimeError("Values are computed from the counts.")
+
+    def memory_report(self):
+        # The counts belong to the counter
+        return {}
+
+    def has_data(self, conditional):
+        return self.counter.totals.get_value(conditional) > 0
+
+    def get_block(self, evidence, default=0.0):
+        """
+        Conditional probabilities of all combinations of the free variables at once.
+
+        Parameters
+        ----------
+        evidence : {string: string}
+            Values of (at least) the counter's evidence variables.
+        default : float
+            Value for combinations of which the conditional variables have no data.
+
+        Returns
+        -------
+        DenseTable
+            Table over the counter's free variables.
+        """
+        counter = self.counter
+        if counter.blocks is None or counter.sparse:
+            raise RuntimeError("Counts are not grouped by evidence in dense blocks.")
+
+        block = easl.utils.DenseTable(counter.free)
+
+        key = tuple(evidence[x] for x in counter.evidence)
+        if key in counter.blocks:
+            counts = counter.blocks[key].table.astype(float)
+        else:
+            counts = np.zeros(block.shape)
+
+        key = tuple(evidence[x] for x in counter.total_evidence)
+        if key in counter.total_blocks:
+            totals = counter.total_blocks[key].table.astype(float)
+        else:
+            totals = np.zeros(tuple(len(counter.total_free[x]) for x in sorted(counter.total_free)))
+
+        # Give the totals an axis of length one for every free conditioned variable
+        totals = totals.reshape([len(block.get_variables()[x]) if x in counter.total_free else 1 for x in block.order])
+
+        # P(M|R) = F(M&R) / F(R)
+        block.table.fill(default)
+        np.divide(counts, totals, out=block.table, where=np.broadcast_to(totals > 0, block.shape))
+
+        return block
+
+    def get_support(self, evidence):
+        """
+        Conditional probabilities of only the combinations of the free
+        variables that were counted.
+
+        Parameters
+        ----------
+        evidence : {string: string}
+            Values of (at least) the counter's evidence variables.
+
+        Returns
+        -------
+        values : {(string): float}
+            Conditional probability of every counted combination of free
+            variables, in the order of the counter's `free_order`.
+        conditional : set((string))
+            Combinations of the free conditional variables that have data,
+            in the order of the counter's `total_free_order`.
+        """
+        counter = self.counter
+        if counter.blocks is None or not counter.sparse:
+            raise RuntimeError("Counts are not grouped by evidence in sparse blocks.")
+
+        counts = counter.blocks.get(tuple(evidence[x] for x in counter.evidence), {})
+        totals = counter.total_blocks.get(tuple(evidence[x] for x in counter.total_evidence), {})
+
+        # Positions of the free variables among the values of a row followed by the rest
+        order = counter.total_free_order + counter.rest_order
+        indices = [order.index(x) for x in counter.free_order]
+
+        # P(M|R) = F(M&R) / F(R)
+        values = {}
+        for row, rests in counts.iteritems():
+            f_r = float(totals[row])
+            for rest, f in rests.iteritems():
+                combination = row + rest
+                values[tuple(combination[i] for i in indices)] = f / f_r
+
+        return values, set(row for row, f in totals.iteritems() if f > 0)
+
+    def get_row_probability(self, evidence, row):
+        """
+        Parameters
+        ----------
+        evidence : {string: string}
+            Values of (at least) the counter's evidence variables.
+        row : (string)
+            Values of the free conditional variables, in the order of the
+            counter's `total_free_order`.
+
+        Returns
+        -------
+        float
+            Sum of the conditional probabilities of all combinations of the
+            other free variables given the row, or None if the row has no data.
+        """
+        counter = self.counter
+        if counter.blocks is None or not counter.sparse:
+            raise RuntimeError("Counts are not grouped by evidence in sparse blocks.")
+
+        total = counter.total_blocks.get(tuple(evidence[x] for x in counter.total_evidence), {}).get(row, 0)
+        if total == 0:
+            return None
+
+        sampler = self.get_row_sampler(evidence, row)
+        return 0.0 if sampler is None else sampler[1][-1] / float(total)
+
+    def get_row_sampler(self, evidence, row):
+        """
+        Counted combinations of the other free variables given the row, to
+        draw them in proportion to their conditional probabilities.
+
+        Parameters
+        ----------
+        evidence : {string: string}
+            Values of (at least) the counter's evidence variables.
+        row : (string)
+            See `get_row_probability`.
+
+        Returns
+        -------
+        ([(string)], [number])
+            See `FrequencyCounter.get_sampler`.
+        """
+        counter = self.counter
+        return counter.get_sampler(tuple(evidence[x] for x in counter.evidence), row)
+
+
+class BayesianNetwork(Table):
+    """
+    Joint probability distribution factorized over a directed acyclic graph,
+    as the product of the probability of every node given its parents:
+
+        P(x_1, ..., x_n) = \prod_i P(x_i | parents(x_i))
+
+    Every factor is read from the counts of a FrequencyCounter over only the
+    node and its parents, so the size grows with the number of nodes and
+    their parents instead of with all combinations of all nodes.
+    Factors of which the parents' values have no data are uniform.
+
+    Attributes
+    ----------
+    graph : Graph
+    variables : {string: [string]}
+        Nodes of the graph and their possible values.
+    parents : {string: [string]}
+    counters : {string: FrequencyCounter}
+        Counts of every node with its parents.
+    """
+    def __init__(self, graph, variables, motor, window=None, decay=None):
+        """
+        Parameters
+        ----------
+        graph : Graph
+        variables : {string: [string]}
+            Possible values of the nodes; nodes of the graph that are not in it are left out.
+        motor : [string]
+        """
+        self.graph = graph
+        self.variables = {node: variables[node] for node in graph.get_nodes() if node in variables}
+
+        super(BayesianNetwork, self).__init__(self.variables)
+
+        self.parents = {}
+        self.counters = {}
+        self.cpts = {}
+        for node in self.variables:
+            self.parents[node] = [parent for parent in graph.get_parents(node) if parent in self.variables]
+
+            family = {x: self.variables[x] for x in [node] + self.parents[node]}
+            if len(self.parents[node]) > 0:
+                self.counters[node] = FrequencyCounter(family, motor, [node], window=window, decay=decay)
+                self.cpts[node] = self.counters[node].get_conditional()
+            else:
+                self.counters[node] = FrequencyCounter(family, motor, window=window, decay=decay)
+
+    def add_data(self, data):
+        """
+        Counts all entries of the Data, and all entries that are added to it.
+
+        Parameters
+        ----------
+        data : Data
+        """
+        for node in self.counters:
+            data.add_counter(self.counters[node])
+
+    def get_factor(self, node, row):
+        """
+        Returns
+        -------
+        float
+            P(node|parents) for the values in the row.
+        """
+        counter = self.counters[node]
+
+        if node in self.cpts:
+            if self.cpts[node].has_data(row):
+                return self.cpts[node].get_value(row)
+        elif counter.total > 0:
+            return counter.freq.get_value(row) / float(counter.total)
+
+        return 1 / float(len(self.variables[node]))
+
+    def get_value(self, row):
+        p = 1.0
+        for node in self.variables:
+            p *= self.get_factor(node, row)
+
+        return p
+
+    def set_value(self, row, value):
+        raise RuntimeError("Values are computed from the counts.")
+
+    def memory_report(self):
+        return {node: counter.nbytes() for node, counter in self.counters.iteritems()}
+
+    def prob(self, vals):
+        return self.get_value(vals)
 
 
 class DistributionComputer(object):
+    """
+    Computes frequency and probability tables from all entries in a Data.
+
+    Tables are computed with one of three backends:
+     * SPARSE: hash-keyed SparseTables that are counted one entry at a time.
+     * DENSE: ndarray-backed DenseTables that are counted all at once by
+       encoding the entries as integers; these hold every combination of
+       values, so the product of the domain sizes should fit in memory.
+     * SKETCH: Count-Min sketches of a fixed size, that overestimate every
+       count by at most SKETCH_EPSILON times the number of entries, with
+       probability 1 - SKETCH_DELTA; for when even the counted combinations
+       do not fit in memory. These can only be queried, not enumerated.
+    """
+    SPARSE = "sparse"
+    DENSE = "dense"
+    SKETCH = "sketch"
+
+    SKETCH_EPSILON = 0.001
+    SKETCH_DELTA = 0.01
+
     @staticmethod
-    def compute_frequency_table(variables, data, motor):
+    def compute_frequency_table(variables, data, motor, backend=SPARSE):
         """
         Parameters
         ----------
         variables : [string]
         data : Data
         motor : [string]
+        backend : string
+            One of SPARSE, DENSE or SKETCH.
         """
-        freq = SparseTable(variables)
+        if backend == DistributionComputer.DENSE:
+            freq = easl.utils.DenseTable(variables, dtype=np.int64)
+
+            columns, values = data.get_columns_previous_current(variables.keys(), motor)
+
+            # Translate the codes of the data to the codes of the table
+            codes = []
+            for name in freq.order:
+                translation = np.array([freq.indices[name][value] for value in values[name]] + [Data.MISSING],
+                                       dtype=np.intp)
+                codes.append(translation[columns[name]])
+            codes = np.column_stack(codes)
+
+            # Only count times at which all variables have a value
+            codes = codes[(codes != Data.MISSING).all(axis=1)]
+            freq.add_counts(codes)
+
+            return freq, len(codes)
 
-        first = 2
+        if backend == DistributionComputer.SKETCH:
+            freq = easl.utils.CountMinTable(variables, DistributionComputer.SKETCH_EPSILON,
+                                            DistributionComputer.SKETCH_DELTA)
+        else:
+            freq = SparseTable(variables)
+
+        first = data.first_time() + 2
         last = data.last_time() + 1
 
         n = 0
@@ -80,19 +922,51 @@ class DistributionComputer(object):
         return freq, n
 
     @staticmethod
-    def compute_joint_probability_distribution(variables, data, motor):
-        freq, n = DistributionComputer.compute_frequency_table(variables, data, motor)
+    def compute_joint_probability_distribution(variables, data, motor, backend=SPARSE):
+        freq, n = DistributionComputer.compute_frequency_table(variables, data, motor, backend)
+
+        if backend == DistributionComputer.DENSE:
+            return easl.utils.DenseTable(variables, freq.table / float(max(n, 1)))
 
         if n > 0:
             freq.do_operation(lambda x: x / float(n))
 
+        if backend == DistributionComputer.SKETCH:
+            return freq
+
         return easl.utils.Distribution(variables, freq)
 
     @staticmethod
-    def compute_conditional_probability_distribution(variables, data, motor, conditioned):
+    def compute_factorized_probability_distribution(graph, variables, data, motor):
+        """
+        Joint probability distribution factorized over a graph, which keeps
+        following the data as entries are added.
+
+        Parameters
+        ----------
+        graph : Graph
+            Directed acyclic graph between the variables.
+
+        Returns
+        -------
+        BayesianNetwork
+        """
+        network = BayesianNetwork(graph, variables, motor)
+        network.add_data(data)
+
+        return network
+
+    @staticmethod
+    def compute_conditional_probability_distribution(variables, data, motor, conditioned, backend=SPARSE):
         """
         """
-        freq, n = DistributionComputer.compute_frequency_table(variables, data, motor)
+        if backend == DistributionComputer.SKETCH:
+            return DistributionComputer.__compute_sketch_conditional(variables, data, motor, conditioned)
+
+        freq, n = DistributionComputer.compute_frequency_table(variables, data, motor, backend)
+
+        if backend == DistributionComputer.DENSE:
+            return DistributionComputer.__compute_dense_conditional(variables, freq, conditioned)
 
         # Total number of occurences with only exploration variables
         totals = SparseTable({k: v for k, v in variables.iteritems()
@@ -102,18 +976,42 @@ class DistributionComputer(object):
 
         # Make conditional on exploration variables
         # i.e. divide by total number of
-        for entry in freq.get_nonzero_entries():
-            filtered = {k: v for k, v in entry.iteritems() if k not in conditioned}
+        for entry, f in freq.iter_nonzero_entries():
             # Add the values to increase the total
-            totals.set_value(filtered, totals.get_value(filtered) + freq.get_value(entry))
+            totals.set_value(entry, totals.get_value(entry) + f)
 
         # Make conditional table by dividing by subtotals
-        for entry in freq.get_nonzero_entries():
-            filtered = {k: v for k, v in entry.iteritems() if k not in conditioned}
-
+        for entry, f in freq.iter_nonzero_entries():
             # P(M|R) = F(M&R) / F(R)
-            f_r = float(totals.get_value(filtered))
-            jpd.set_value(entry, 0 if f_r == 0 else freq.get_value(entry) / f_r)
+            f_r = float(totals.get_value(entry))
+            jpd.set_value(entry, 0 if f_r == 0 else f / f_r)
+
+        return jpd
+
+    @staticmethod
+    def __compute_dense_conditional(variables, freq, conditioned):
+        conditional = {k: v for k, v in variables.iteritems() if k not in conditioned}
+
+        counts = Factor.from_table(freq)
+
+        # P(M|R) = F(M&R) / F(R)
+        jpd = easl.utils.DenseConditionalTable(variables, conditional, counts.normalize(conditioned).values)
+        # Total number of occurrences of the conditional variables, by summing out the conditioned variables,
+        # which keep their sorted order
+        jpd.conditional_table.table = counts.sum_out(conditioned).values > 0
+
+        return jpd
+
+    @staticmethod
+    def __compute_sketch_conditional(variables, data, motor, conditioned):
+        conditional = {k: v for k, v in variables.iteritems() if k not in conditioned}
+
+        # Counts of all variables and of only the conditional ones are sketched together
+        jpd = easl.utils.CountMinConditionalTable(variables, conditional, DistributionComputer.SKETCH_EPSILON,
+                                                  DistributionComputer.SKETCH_DELTA)
+
+        for t_i in range(data.first_time() + 2, data.last_time() + 1):
+            jpd.inc_value(data.get_entries_previous_current(t_i, variables.keys(), motor))
 
         return jpd
 
@@ -136,6 +1034,15 @@ class CausalLearningMechanism(Mechanism):
     # Experiment phase: phase after the exploration phase; learn association with environment
     STATE_EXPERIMENT = 1
 
+    # Action selection: go over every combination of motor signals one by one
+    SELECTION_ENUMERATE = 0
+    # Action selection: calculate the probabilities of all combinations at once as array operations
+    SELECTION_TENSOR = 1
+    # Action selection: sum only over the combinations that were counted, with the rest in closed form
+    SELECTION_SPARSE = 2
+    # Action selection: estimate the probabilities from samples of the limb positions, within a budget
+    SELECTION_SAMPLING = 3
+
     # suffixes to use for the current/previous nodes in the network
     PREVIOUS = "_previous"
     CURRENT = "_current"
@@ -164,9 +1071,24 @@ class CausalLearningMechanism(Mechanism):
             Used to create a numbering of nodes that is used to determine the network's edges' directions.
         data : Data
             Stores previous information from environment and motor signals.
+        data2 : Data
+            Similar to `data`, but for the experiment phase.
+        counts : FrequencyCounter
+            Frequencies of the exploration nodes in `data`, for `jpd`.
+        counts2 : FrequencyCounter
+            Frequencies of the limb nodes given the motor nodes in `data`, for `jpd2`.
+        counts3 : FrequencyCounter
+            Frequencies of the ignored nodes given the limb nodes in `data2`, for `jpd3`.
         network : Graph
             Causal network that is calculated every iteration; is stored for reference.
-        jpd2 : Distribution
+        structure : StructureLearner
+            Learns `network` from both `data` and `data2`, if structure learning is set.
+        jpd : Distribution
+            Joint probability distribution of the exploration nodes, or a
+            BayesianNetwork if the joint is factorized.
+        factorized_graph : Graph
+            Graph to factorize `jpd` over, if it is not the learned `network`.
+        jpd2 : ConditionalFrequencyView
         current_information : {string: string}
             Variable assignments at the current iteration from the environment.
         new_information : {string: string}
@@ -177,6 +1099,22 @@ class CausalLearningMechanism(Mechanism):
         selection_bias : float
             Determines by which probability a 'still' motor signal is chosen.
             TODO: Hacked specifically for the babybot now; might be necessary to generalize later.
+        count_window : int
+            Number of latest entries that P(limb|motor) and P(mobile|limb) are calculated from, or None for all.
+        count_decay : float
+            Factor by which older entries count less for P(limb|motor) and P(mobile|limb), or None.
+        count_dtype : type
+            Type of the counts of P(limb|motor) and P(mobile|limb) in the tensor mode, or None for the default.
+        count_sketch : (float, float)
+            Error and its probability of the sketches that the counts of P(limb|motor) and P(mobile|limb) are
+            approximated in, or None to count exactly.
+        selection_mode
+            How the combination of motor signals with the maximum probability is found.
+        sample_budget : int
+            Number of limb positions sampled per selection in the sampling mode.
+        sample_confidence : float
+            Confidence of the bounds by which combinations of motor signals
+            are no longer sampled in the sampling mode.
         """
         super(CausalLearningMechanism, self).__init__(visual=CausalLearningVisual())
 
@@ -187,6 +1125,8 @@ class CausalLearningMechanism(Mechanism):
 
         self.motor_signal_valuation = lambda x: 1.0
         self.motor_signal_bias = 1.0
+        self.motor_signal_bound = None
+        self.valuation_bounds = {}
 
         self.ignored_variables = []
         self.considered_signals = []
@@ -216,7 +1156,14 @@ class CausalLearningMechanism(Mechanism):
 
         self.data = Data()
         self.data2 = Data()
+        self.counts = None
+        self.counts2 = None
+        self.counts3 = None
         self.network = None
+        self.structure = None
+        self.structure_parameters = None
+        self.factorized = False
+        self.factorized_graph = None
         self.jpd = None
         # P(limb|motor)
         self.jpd2 = None
@@ -232,6 +1179,16 @@ class CausalLearningMechanism(Mechanism):
 
         self.epsilon = 0.2
 
+        self.count_window = None
+        self.count_decay = None
+        self.count_dtype = None
+        self.count_sketch = None
+
+        self.selection_mode = self.SELECTION_ENUMERATE
+
+        self.sample_budget = 1000
+        self.sample_confidence = 0.95
+
     def init_internal(self, entity):
         super(CausalLearningMechanism, self).init_internal(entity)
 
@@ -239,14 +1196,216 @@ class CausalLearningMechanism(Mechanism):
         self.__create_node_numbering()
         self.__add_experiment_nodes()
 
+        # Keep the frequencies up to date with every new entry
+        motor = self.motor_signals_and_domains.keys()
+        # Group the counts by what is known at selection, so all combinations can be looked up at once
+        evidence = None
+        if self.selection_mode != self.SELECTION_ENUMERATE:
+            evidence = self.__evidence_nodes()
+        sparse = self.selection_mode != self.SELECTION_TENSOR
+
+        # A factorized joint counts only the nodes with their parents instead
+        if not self.factorized:
+            self.counts = FrequencyCounter(self.node_values, motor)
+        elif self.factorized_graph is None and self.structure_parameters is None:
+            raise RuntimeError("A factorized joint needs a graph or structure learning.")
+
+        self.counts2 = FrequencyCounter(self.node_values_cond_motor, motor, self.node_values_limb.keys(), evidence,
+                                        self.count_window, self.count_decay, sparse, self.count_dtype,
+                                        self.count_sketch)
+        self.counts3 = FrequencyCounter(self.node_values_cond_limb, motor, self.node_values_exp.keys(), evidence,
+                                        self.count_window, self.count_decay, sparse, self.count_dtype,
+                                        self.count_sketch)
+
+        if self.counts is not None:
+            self.data.add_counter(self.counts)
+        self.data.add_counter(self.counts2)
+        self.data2.add_counter(self.counts3)
+
+        if self.structure_parameters is not None:
+            statistics = SufficientStatistics(self.node_values_all, motor)
+            self.data.add_counter(statistics)
+            self.data2.add_counter(statistics)
+
+            tiers = {node: 0 if node.endswith(self.PREVIOUS) else 1 for node in self.node_values_all}
+            self.structure = StructureLearner(statistics, tiers, self.numberings, **self.structure_parameters)
+
         print self.nodes_all
 
     def set_selection_bias(self, bias):
         self.selection_bias = bias
 
-    def set_motor_signal_bias(self, valuation, bias):
+    def set_history_capacity(self, capacity):
+        """
+        Keep only the latest entries of the experiment phase.
+
+        The frequencies are kept up to date as entries are added, so older
+        entries are not needed to select motor signals.
+        Should be set before the simulation starts.
+
+        Parameters
+        ----------
+        capacity : int
+            Number of entries to keep; at least 3.
+        """
+        self.data2 = Data(capacity)
+
+    def memory_report(self):
+        """
+        Returns
+        -------
+        {string: int}
+            Size in bytes of every set of counts.
+        """
+        report = {}
+        for name, counts in [("counts", self.counts), ("counts2", self.counts2), ("counts3", self.counts3)]:
+            if counts is not None:
+                report[name] = counts.nbytes()
+        if isinstance(self.jpd, BayesianNetwork):
+            report["jpd"] = self.jpd.nbytes()
+
+        return report
+
+    def set_count_window(self, window):
+        """
+        Only count the latest entries for P(limb|motor) and P(mobile|limb).
+
+        Should be set before the simulation starts.
+
+        Parameters
+        ----------
+        window : int
+            Number of entries.
+        """
+        self.count_window = window
+
+    def set_count_decay(self, decay):
+        """
+        Let all counts for P(limb|motor) and P(mobile|limb) decay with every new entry.
+
+        Should be set before the simulation starts.
+
+        Parameters
+        ----------
+        decay : float
+            Factor between 0 and 1 by which the counts are multiplied.
+        """
+        self.count_decay = decay
+
+    def set_count_dtype(self, dtype):
+        """
+        Store the counts of P(limb|motor) and P(mobile|limb) in the tensor mode
+        in a narrower type, e.g. np.uint16, to use less memory; counts that do
+        not fit are promoted to a wider type.
+
+        Should be set before the simulation starts.
+
+        Parameters
+        ----------
+        dtype : type
+        """
+        self.count_dtype = dtype
+
+    def set_count_sketch(self, epsilon=0.001, delta=0.01):
+        """
+        Approximate the counts of P(limb|motor) and P(mobile|limb) in Count-Min
+        sketches, which take a fixed amount of memory however many
+        combinations are counted.
+        Counts are overestimated, so combinations without data may seem to
+        have some.
+
+        Only the enumerate mode can use sketched counts, as the other modes
+        read them by evidence.
+        Should be set before the simulation starts.
+
+        Parameters
+        ----------
+        epsilon : float
+            Error of the counts, as a fraction of the number of entries.
+        delta : float
+            Probability that a count has a larger error.
+        """
+        self.count_sketch = (epsilon, delta)
+
+    def set_structure_learning(self, alpha=0.05, max_level=2, processes=None):
+        """
+        Learn the causal network between the nodes from the collected data,
+        at the end of exploration and then at every iteration.
+
+        Should be set before the simulation starts.
+
+        Parameters
+        ----------
+        alpha : float
+            Significance level of the independence tests.
+        max_level : int
+            Maximum number of nodes to condition on.
+        processes : int
+            Number of worker processes to run independence tests in, or None.
+        """
+        self.structure_parameters = {"alpha": alpha, "max_level": max_level, "processes": processes}
+
+    def set_factorized_joint(self, graph=None):
+        """
+        Factorize the joint probability distribution of the exploration data
+        over a graph instead of counting all combinations of all nodes.
+
+        Should be set before the simulation starts.
+
+        Parameters
+        ----------
+        graph : Graph, optional
+            Directed acyclic graph between the nodes; when not given, the
+            network learned at the end of exploration is used, which needs
+            structure learning to be set.
+        """
+        self.factorized = True
+        self.factorized_graph = graph
+
+    def set_selection_mode(self, mode):
+        """
+        Parameters
+        ----------
+        mode
+            One of SELECTION_ENUMERATE, SELECTION_TENSOR, SELECTION_SPARSE or SELECTION_SAMPLING.
+            Should be set before the simulation starts.
+        """
+        self.selection_mode = mode
+
+    def set_sampling(self, samples=1000, confidence=0.95):
+        """
+        Parameters
+        ----------
+        samples : int
+            Number of limb positions to sample per selection in the sampling
+            mode; every combination of motor signals with data gets at least
+            one, and those without data together get at least one.
+        confidence : float
+            Confidence of the bounds on the estimated probabilities; a
+            combination of motor signals is no longer sampled when its upper
+            bound is below the highest lower bound.
+        """
+        self.sample_budget = samples
+        self.sample_confidence = confidence
+
+    def set_motor_signal_bias(self, valuation, bias, bound=None):
+        """
+        Parameters
+        ----------
+        valuation : function
+            Takes a combination of motor signals and returns how much it is valued.
+        bias : float
+        bound : function, optional
+            Takes a partial combination of motor signals and returns an upper
+            bound of the valuation of all combinations that include it, so
+            that combinations can be skipped when selecting the maximum.
+            Without a bound, the highest valuation of those combinations is
+            used.
+        """
         self.motor_signal_valuation = valuation
         self.motor_signal_bias = bias
+        self.motor_signal_bound = bound
+        self.valuation_bounds = {}
 
     def set_rewards(self, vals):
         self.rewards.update(vals)
@@ -256,6 +1415,7 @@ class CausalLearningMechanism(Mechanism):
 
     def set_considered_signals(self, signals):
         self.considered_signals = signals
+        self.valuation_bounds = {}
 
     def set_considered_sensory(self, sensory):
         self.considered_sensory = sensory
@@ -330,12 +1490,20 @@ class CausalLearningMechanism(Mechanism):
 
         if self.iteration == self.exploration_iterations:
             print "Exploration Complete"
-            # Calculate the probability table from the exploration data once
-            self.jpd = DistributionComputer.compute_joint_probability_distribution(self.node_values, self.data, self.motor_signals_and_domains.keys())
-            self.jpd2 = DistributionComputer.compute_conditional_probability_distribution(self.node_values_cond_motor,
-                                                                                          self.data,
-                                                                                          self.motor_signals_and_domains.keys(),
-                                                                                          self.node_values_limb.keys())
+            # The probability tables are read from the counts that were kept during exploration
+            self.jpd2 = self.counts2.get_conditional()
+            # Follows the counts of the experiment data as they are added
+            self.jpd3 = self.counts3.get_conditional()
+
+            if self.structure is not None:
+                self.network = self.structure.learn()
+
+            if self.factorized:
+                graph = self.network if self.factorized_graph is None else self.factorized_graph
+                self.jpd = DistributionComputer.compute_factorized_probability_distribution(
+                    graph, self.node_values, self.data, self.motor_signals_and_domains.keys())
+            else:
+                self.jpd = self.counts.get_joint()
 
             # Transfer data so new actions can be calculated immediately
             self.data2.add_entry(self.data.get_latest_entry(2))
@@ -350,18 +1518,16 @@ class CausalLearningMechanism(Mechanism):
             # Motor babbling; select random motor signals
             motor_signals = self.__select_random_motor_signals()
         elif self.state == self.STATE_EXPERIMENT:
-            # Select signals by maximum likelihood from collected (all) data
-            self.jpd3 = DistributionComputer.compute_conditional_probability_distribution(self.node_values_cond_limb,
-                                                                                          self.data2,
-                                                                                          self.motor_signals_and_domains.keys(),
-                                                                                          self.node_values_exp.keys())
+            if self.structure is not None:
+                self.network = self.structure.update()
 
+            # Select signals by maximum likelihood from collected (all) data
             r = random.random()
             if r < self.epsilon:
                 print "Selecting randomly"
                 motor_signals = self.__select_random_motor_signals()
             else:
-                motor_signals = self.__select_maximum()
+                motor_signals = self.__select_motor_signals()
 
         self.new_information = {}
         self.new_information.update(self.current_information)
@@ -377,33 +1543,32 @@ class CausalLearningMechanism(Mechanism):
 
         return motor_signals
 
-    def __select_maximum(self):
-        # Select the combination of motor signals that maximizes probability
-        constant = {}
-
-        # Set latest selected motor signals as previous motor signals
-        for signal in self.motor_signals_and_domains.keys():
-            constant[signal + self.PREVIOUS] = self.data2.get_latest_entry()[signal]
-
-        # Set latest known limb positions as previous limb positions
-        for signal in self.sensory_variables_and_domains.keys():
-            if signal in self.ignored_variables:
-                continue
-
-            constant[signal + self.PREVIOUS] = self.current_information[signal]
+    def __select_motor_signals(self):
+        """
+        Select the combination of motor signals that maximizes probability,
+        with the selection mode.
+        """
+        if self.selection_mode == self.SELECTION_TENSOR:
+            max_valuation, max_combinations = self.__select_maximum_tensor()
+        elif self.selection_mode == self.SELECTION_SPARSE:
+            max_valuation, max_combinations = self.__select_maximum_sparse()
+        elif self.selection_mode == self.SELECTION_SAMPLING:
+            max_valuation, max_combinations = self.__select_maximum_sampling()
+        else:
+            max_valuation, max_combinations = self.__select_maximum()
 
-        # Set latest known mobile thing as previous mobile thing
-        for signal in self.ignored_variables:
-            constant[signal + self.PREVIOUS] = self.current_information[signal]
+        if len(max_combinations) is not 0:
+            max_combination = random.choice(max_combinations)
+            print "Selected {0} with probability {1}".format(max_combination, max_valuation)
+            return [(k, v) for k, v in max_combination.iteritems()]
+        else:
+            return None
 
-        for signal in self.rewards:
-            constant[signal + self.CURRENT] = self.rewards[signal]
+    def __select_maximum(self):
+        # Find the combinations of motor signals that maximize probability
+        constant = self.__get_constant()
 
-        # Get maximum probability by checking all possible combinations of motor signals
-        max_valuation = 0.0
-        max_combinations = []
-        for combination in self.all_possibilities({k: v for k, v in self.motor_signals_and_domains.iteritems() if k in self.considered_signals}):
-        #for combination in self.__subset_possibilities(self.actions, 1):
+        def score(combination):
             combination.update({k: "still" for k in self.motor_signals_and_domains.keys() if k not in self.considered_signals})
 
             assignment = {}
@@ -448,23 +1613,440 @@ class CausalLearningMechanism(Mechanism):
                     total += pl_m * pmm_l
                     #print "total {0} = {1} * {2}".format(total, pl_m, pmm_l)
 
-            valuation = total * self.motor_signal_valuation(combination)
+            return total * self.motor_signal_valuation(combination)
+
+        # Get maximum probability by checking all possible combinations of motor signals
+        considered = {k: v for k, v in self.motor_signals_and_domains.iteritems() if k in self.considered_signals}
+        # P(mobile|limb) is at most one, and P(limb|motor) sums to at most one over the current limb positions,
+        # or is 1/81 for each of them without data; other sensory variables repeat every limb position
+        sensory = [k for k in self.sensory_variables_and_domains.keys() if k not in self.rewards.keys()]
+        limb = [k + self.CURRENT for k in sensory if k + self.CURRENT in self.node_values_cond_motor]
+        size = self.__get_domain_size(limb)
+        probability = np.prod([len(self.sensory_variables_and_domains[k]) for k in sensory]) / float(size) * \
+            max(1.0, size / float(81))
+
+        bound = lambda partial: probability * max(0.0, self.__get_valuation_bound(partial))
+        return branch_and_bound(considered.items(), score, bound)
+
+    def __get_valuation_bound(self, partial):
+        """
+        Parameters
+        ----------
+        partial : {string: string}
+            Values of some of the considered motor signals.
+
+        Returns
+        -------
+        float
+            Upper bound of the valuation of all combinations that include the
+            partial one, or the highest of their valuations if no bound is set.
+        """
+        partial = dict(partial)
+        partial.update({k: "still" for k in self.motor_signals_and_domains.keys() if k not in self.considered_signals})
+
+        if self.motor_signal_bound is not None:
+            return self.motor_signal_bound(partial)
 
-            if valuation == max_valuation:
-                max_combinations.append(combination)
-            elif valuation > max_valuation:
-                print "Updated"
-                max_valuation = valuation
-                max_combinations = []
-                max_combinations.append(combination)
+        key = frozenset(partial.iteritems())
+        if key not in self.valuation_bounds:
+            free = [k for k in self.motor_signals_and_domains.keys() if k not in partial]
 
-        if len(max_combinations) is not 0:
-            max_combination = random.choice(max_combinations)
-            print "Selected {0} with probability {1}".format(max_combination, max_valuation)
-            return [(k, v) for k, v in max_combination.iteritems()]
-        else:
+            highest = None
+            for values in itertools.product(*[self.motor_signals_and_domains[k] for k in free]):
+                combination = dict(partial)
+                combination.update(zip(free, values))
+                valuation = self.motor_signal_valuation(combination)
+                if highest is None or valuation > highest:
+                    highest = valuation
+            self.valuation_bounds[key] = highest
+
+        return self.valuation_bounds[key]
+
+    def __to_combination(self, assignment):
+        """
+        Motor signal values of an assignment of (some) current motor nodes,
+        with the signals that are not considered kept still.
+        """
+        combination = {node[:-len(self.CURRENT)]: assignment[node] for node in sorted(assignment)}
+        combination.update({k: "still" for k in self.motor_signals_and_domains.keys() if k not in self.considered_signals})
+
+        return combination
+
+    def __get_constant(self):
+        """
+        Returns
+        -------
+        {string: string}
+            Values of the nodes that are known when selecting motor signals.
+        """
+        constant = {}
+
+        # Set latest selected motor signals as previous motor signals
+        for signal in self.motor_signals_and_domains.keys():
+            constant[signal + self.PREVIOUS] = self.data2.get_latest_entry()[signal]
+
+        # Set latest known limb positions as previous limb positions
+        for signal in self.sensory_variables_and_domains.keys():
+            if signal in self.ignored_variables:
+                continue
+
+            constant[signal + self.PREVIOUS] = self.current_information[signal]
+
+        # Set latest known mobile thing as previous mobile thing
+        for signal in self.ignored_variables:
+            constant[signal + self.PREVIOUS] = self.current_information[signal]
+
+        for signal in self.rewards:
+            constant[signal + self.CURRENT] = self.rewards[signal]
+
+        return constant
+
+    def __evidence_nodes(self):
+        """
+        Returns
+        -------
+        [string]
+            Nodes of which the values are given by `__get_constant` or kept still.
+        """
+        evidence = [node for node in self.node_values_all if node.endswith(self.PREVIOUS)]
+        evidence += [signal + self.CURRENT for signal in self.rewards]
+        evidence += [signal + self.CURRENT for signal in self.motor_signals_and_domains
+                     if signal not in self.considered_signals]
+
+        return evidence
+
+    def __select_maximum_tensor(self):
+        """
+        Select the combination of motor signals that maximizes probability,
+        like `__select_maximum`, but with the sum over all limb positions of
+        P(limb|motor) * P(mobile|limb) for all combinations of motor signals as
+        a single array product.
+
+        Valuations that are equal up to rounding are considered ties.
+        """
+        constant = self.__get_constant()
+        # Motor signals that are not considered are kept still
+        constant.update({k + self.CURRENT: "still" for k in self.motor_signals_and_domains.keys()
+                         if k not in self.considered_signals})
+
+        # P(limb|motor) for all combinations of current motor signals and limb positions
+        pl_m = self.jpd2.get_block(constant, 1 / float(81))
+        # P(mobile|limb) for all combinations of current limb positions
+        pmm_l = self.jpd3.get_block(constant, 1 / float(16))
+
+        if len(pmm_l.order) == 0:
+            # All nodes are known, so there is nothing to marginalize over
+            return self.__select_maximum()
+
+        multiplicity = self.__get_multiplicity(pl_m.order + pmm_l.order)
+
+        # Marginalize over current limb positions: sum out all variables that are not motor signals
+        motor = [node for node in pl_m.order if node in self.node_values_motor]
+        totals = Factor.eliminate([Factor.from_table(pl_m), Factor.from_table(pmm_l)], motor).values * multiplicity
+
+        return self.__select_maximum_valuation(motor, totals.ravel())
+
+    def __select_maximum_sparse(self):
+        """
+        Select the combination of motor signals that maximizes probability,
+        like `__select_maximum`, but summing P(limb|motor) * P(mobile|limb)
+        only over the combinations that were counted.
+
+        Limb positions without data for P(mobile|limb), and motor signals
+        without data for P(limb|motor), all have the same default
+        probability, so their terms are added up in closed form.
+        """
+        terms = self.__get_support_terms()
+        if terms is None:
+            return self.__select_maximum()
+        motor, support, conditional2, default2, multiplicity = terms
+
+        sums = {}
+        for key, entries in support.iteritems():
+            total = 0.0
+            for p, b in entries:
+                total += p * b
+            sums[key] = total
+
+        # Highest total and number of motor signals with data for every partial combination
+        highest = {}
+        counted = {}
+        for values in conditional2:
+            for i in range(len(values) + 1):
+                prefix = values[:i]
+                highest[prefix] = max(highest.get(prefix, 0.0), sums.get(values, 0.0))
+                counted[prefix] = counted.get(prefix, 0) + 1
+
+        def score(assignment):
+            values = tuple(assignment[node] for node in motor)
+            total = sums.get(values, 0.0) if values in conditional2 else default2
+
+            return total * multiplicity * self.motor_signal_valuation(self.__to_combination(assignment))
+
+        def bound(assignment):
+            prefix = tuple(assignment[node] for node in motor[:len(assignment)])
+            # Motor signals without data all have the default total
+            total = highest.get(prefix, 0.0)
+            if counted.get(prefix, 0) < self.__get_domain_size(motor[len(assignment):]):
+                total = max(total, default2)
+
+            if total == 0.0:
+                return 0.0
+
+            signals = {node[:-len(self.CURRENT)]: value for node, value in assignment.iteritems()}
+            return total * multiplicity * self.__get_valuation_bound(signals)
+
+        max_valuation, max_combinations = branch_and_bound([(node, self.node_values_motor[node]) for node in motor],
+                                                           score, bound, rtol=1e-9)
+
+        return max_valuation, [self.__to_combination(assignment) for assignment in max_combinations]
+
+    def __select_maximum_sampling(self):
+        """
+        Select the combination of motor signals that approximately maximizes
+        probability, like `__select_maximum_sparse`, but with the sum over
+        limb positions of P(limb|motor) * P(mobile|limb) estimated by forward
+        sampling limb positions from the counts of P(limb|motor) given the
+        known values, and averaging the sum over the mobile of P(mobile|limb).
+
+        Motor signals without data all have P(limb|motor) = 1/81, so their sum
+        is estimated once, from limb positions sampled uniformly.
+        Sums are sampled in rounds of doubling size, until the sample budget
+        is spent, and are dropped once the Hoeffding upper bound of their
+        estimate is below the highest lower bound.
+        Only the counts of the sampled limb positions are read, so the time
+        per selection is set by the budget and the number of combinations of
+        motor signals, not by the number of counted limb positions.
+        """
+        counter2 = self.jpd2.counter
+        counter3 = self.jpd3.counter
+
+        if len(counter3.free_order) == 0 or not set(counter3.total_free_order) <= set(counter2.rest_order):
+            return self.__select_maximum()
+
+        constant = self.__get_constant()
+        # Motor signals that are not considered are kept still
+        constant.update({k + self.CURRENT: "still" for k in self.motor_signals_and_domains.keys()
+                         if k not in self.considered_signals})
+
+        motor = counter2.total_free_order
+        multiplicity = self.__get_multiplicity(counter2.free_order + counter3.free_order)
+
+        combinations = list(itertools.product(*[self.node_values_motor[node] for node in motor]))
+        valuations = {values: self.motor_signal_valuation(self.__to_combination(dict(zip(motor, values)))) * multiplicity
+                      for values in combinations}
+
+        # Every sampled sum is that of a combination of motor signals with data, or of all without (None);
+        # those with data for other known values only have a sum of zero
+        sums = {}
+        scales = {}
+        for values in combinations:
+            p = self.jpd2.get_row_probability(constant, values)
+            if p is None:
+                sums[values] = None
+            elif p > 0:
+                sums[values] = values
+                # P(limb|motor) does not sum to one when previous limb positions were not counted with these signals
+                scales[values] = p
+        if None in sums.values():
+            # Limb positions that P(limb|motor) has but P(mobile|limb) is not conditioned on
+            extra = [x for x in counter2.rest_order if x not in counter3.total_free_order]
+            scales[None] = self.__get_domain_size(counter3.total_free_order + extra) / float(81)
+
+        # Positions of the limb positions of P(mobile|limb) among those of P(limb|motor)
+        limb = [counter2.rest_order.index(x) for x in counter3.total_free_order]
+        domains = [self.node_values_all[x] for x in counter3.total_free_order]
+        # Limb positions without data have P(mobile|limb) = 1/16 for every value of the mobile
+        default3 = self.__get_domain_size(counter3.rest_order) / float(16)
+        highest = max(1.0, default3)
+
+        def draw(key, n):
+            total = 0.0
+            if key is None:
+                rests, cumulative = None, None
+            else:
+                rests, cumulative = self.jpd2.get_row_sampler(constant, key)
+
+            for _ in range(n):
+                if key is None:
+                    limbs = tuple(random.choice(domain) for domain in domains)
+                else:
+                    i = bisect.bisect_left(cumulative, random.random() * cumulative[-1])
+                    rest = rests[min(i, len(rests) - 1)]
+                    limbs = tuple(rest[j] for j in limb)
+
+                p = self.jpd3.get_row_probability(constant, limbs)
+                total += default3 if p is None else p
+
+            return total
+
+        # Highest valuation of the combinations of every sum
+        best = {}
+        for values, key in sums.iteritems():
+            if key in scales:
+                best[key] = max(best.get(key, 0.0), valuations[values])
+
+        totals = dict.fromkeys(scales, 0.0)
+        counts = dict.fromkeys(scales, 0)
+        sampled = sorted(scales)
+        budget = self.sample_budget
+        log_delta = math.log(2 / (1 - self.sample_confidence))
+
+        def bounds(key):
+            estimate = totals[key] / counts[key]
+            width = highest * math.sqrt(log_delta / (2 * counts[key]))
+            return (estimate - width) * scales[key] * best[key], (estimate + width) * scales[key] * best[key]
+
+        batch = 1
+        while len(sampled) > 0:
+            for key in sampled:
+                n = max(1, min(batch, budget))
+                totals[key] += draw(key, n)
+                counts[key] += n
+                budget -= n
+
+            if budget <= 0:
+                break
+
+            # Drop sums that can not be the maximum
+            lower = max(bounds(key)[0] for key in scales)
+            sampled = [key for key in sampled if bounds(key)[1] >= lower]
+            if len(sampled) <= 1:
+                break
+
+            batch *= 2
+
+        estimates = np.zeros(len(combinations))
+        for i, values in enumerate(combinations):
+            key = sums.get(values, False)
+            if key in scales:
+                estimates[i] = totals[key] / counts[key] * scales[key] * valuations[values]
+
+        max_valuation = estimates.max()
+        max_combinations = np.flatnonzero(np.isclose(estimates, max_valuation, rtol=1e-9, atol=0.0))
+
+        return max_valuation, [self.__to_combination(dict(zip(motor, combinations[i]))) for i in max_combinations]
+
+    def __get_support_terms(self):
+        """
+        Terms of the sum over limb positions of P(limb|motor) * P(mobile|limb)
+        for the combinations of motor signals that have data.
+
+        Returns
+        -------
+        motor : [string]
+            Current motor nodes.
+        support : {(string): [(float, float)]}
+            For every combination of the motor nodes' values with data, P(limb|motor)
+            of every counted limb position, with the sum over the mobile of
+            P(mobile|limb) for that limb position.
+        conditional2 : set((string))
+            Combinations of the motor nodes' values with data.
+        default2 : float
+            Sum for the combinations without data.
+        multiplicity : int
+            Number of terms of every sum, for the sensory variables in neither table.
+
+        None if the tables do not have the limb positions in common.
+        """
+        constant = self.__get_constant()
+        # Motor signals that are not considered are kept still
+        constant.update({k + self.CURRENT: "still" for k in self.motor_signals_and_domains.keys()
+                         if k not in self.considered_signals})
+
+        counter2 = self.jpd2.counter
+        counter3 = self.jpd3.counter
+
+        motor = [node for node in counter2.free_order if node in self.node_values_motor]
+        # Limb positions that P(limb|motor) has but P(mobile|limb) is not conditioned on
+        extra = [node for node in counter2.free_order
+                 if node not in self.node_values_motor and node not in counter3.total_free_order]
+
+        if len(counter3.free_order) == 0 or not set(counter3.total_free_order) <= set(counter2.free_order):
             return None
 
+        # P(limb|motor) and P(mobile|limb) of only the counted combinations
+        values2, conditional2 = self.jpd2.get_support(constant)
+        values3, conditional3 = self.jpd3.get_support(constant)
+
+        # Sum over the mobile of P(mobile|limb) for every limb position with data
+        limb3 = [counter3.free_order.index(x) for x in counter3.total_free_order]
+        sums3 = {}
+        for combination, p in values3.iteritems():
+            limb = tuple(combination[i] for i in limb3)
+            sums3[limb] = sums3.get(limb, 0.0) + p
+
+        # Limb positions without data have P(mobile|limb) = 1/16 for every value of the mobile
+        default3 = self.__get_domain_size([x for x in counter3.free_order if x not in counter3.total_free_order]) / float(16)
+        without3 = self.__get_domain_size(counter3.total_free_order) - len(conditional3)
+        sum3 = sum(sums3.itervalues()) + without3 * default3
+
+        # Motor signals without data have P(limb|motor) = 1/81 for every limb position
+        default2 = 1 / float(81) * self.__get_domain_size(extra) * sum3
+
+        motor2 = [counter2.free_order.index(x) for x in motor]
+        limb2 = [counter2.free_order.index(x) for x in counter3.total_free_order]
+        support = {}
+        for combination, p in values2.iteritems():
+            key = tuple(combination[i] for i in motor2)
+            limb = tuple(combination[i] for i in limb2)
+            support.setdefault(key, []).append((p, sums3.get(limb, 0.0) if limb in conditional3 else default3))
+
+        multiplicity = self.__get_multiplicity(counter2.free_order + counter3.free_order)
+
+        return motor, support, conditional2, default2, multiplicity
+
+    def __get_multiplicity(self, nodes):
+        """
+        Sensory variables that do not appear in any of the nodes still add a
+        term for each of their values when marginalizing.
+        """
+        multiplicity = 1
+        for signal in self.sensory_variables_and_domains:
+            if signal + self.CURRENT not in nodes:
+                multiplicity *= len(self.sensory_variables_and_domains[signal])
+
+        return multiplicity
+
+    def __get_domain_size(self, nodes):
+        size = 1
+        for node in nodes:
+            size *= len(self.node_values_all[node])
+
+        return size
+
+    def __select_maximum_valuation(self, motor, totals):
+        """
+        Parameters
+        ----------
+        motor : [string]
+            Current motor nodes, in the order of all their combinations.
+        totals : array
+            Probability of every combination of the motor nodes' values.
+
+        Valuations that are equal up to rounding are considered ties.
+
+        Returns
+        -------
+        float
+            The maximum valuation.
+        [{string: string}]
+            All combinations of motor signals with the maximum valuation.
+        """
+        combinations = []
+        for values in itertools.product(*[self.node_values_motor[node] for node in motor]):
+            combination = {node[:-len(self.CURRENT)]: value for node, value in zip(motor, values)}
+            combination.update({k: "still" for k in self.motor_signals_and_domains.keys()
+                                if k not in self.considered_signals})
+            combinations.append(combination)
+
+        valuations = totals * np.array([self.motor_signal_valuation(c) for c in combinations])
+
+        max_valuation = valuations.max()
+        max_combinations = np.flatnonzero(np.isclose(valuations, max_valuation, rtol=1e-9, atol=0.0))
+
+        return max_valuation, [combinations[i] for i in max_combinations]
+
     def __are_all_nodes(self, assignment):
         for node in self.node_values_all.keys():
             if node not in assignment.keys():
@@ -40,7 +40,17 @@ class OperantConditioningMechanism(Mechanism):
         Maintains a count for any action/value pair.
     rewards : [(name, value)]
         List of sensory stimuli that are considered as rewarding.
+    possibilities : [{name: value}]
+        All combinations of motor signals.
+    valuations : [float]
+        Valuation of every combination in `possibilities`.
+    weights : SumTree
+        Probability times valuation of every combination in `possibilities`,
+        all multiplied by `weight_scale`, to sample actions from.
     """
+    # Rebuild the weights when their scale gets too far from the probabilities
+    MAX_WEIGHT_SCALE = 1e64
+
     def __init__(self, rewards):
         """
         Parameters
@@ -55,8 +65,14 @@ class OperantConditioningMechanism(Mechanism):
         self.rewards = rewards
 
         self.action = None
+        self.action_index = None
         self.probabilities = None
 
+        self.possibilities = None
+        self.valuations = None
+        self.weights = None
+        self.weight_scale = 1.0
+
         self.motor_signal_valuation = lambda x: 1.0
         self.motor_signal_bias = 1.0
 
@@ -68,10 +84,11 @@ class OperantConditioningMechanism(Mechanism):
         super(OperantConditioningMechanism, self).init_internal(entity)
 
         # Initialize the probability table
-        self.probabilities = utils.FullTable(self.motor_signals_and_domains)
+        self.probabilities = utils.FlatFullTable(self.motor_signals_and_domains)
         # Initialize with uniform distribution
         # Count total possibilities
-        n = len(self.all_possibilities(self.motor_signals_and_domains))
+        self.possibilities = self.all_possibilities(self.motor_signals_and_domains)
+        n = len(self.possibilities)
 
         p = 1 / float(n)
         self.probabilities.map_function_over_all_values(lambda x: p)
@@ -81,6 +98,8 @@ class OperantConditioningMechanism(Mechanism):
         self.motor_signal_valuation = valuation
         self.motor_signal_bias = bias
 
+        self.weights = None
+
     def sense(self, observation):
         name, value = observation
 
@@ -93,7 +112,8 @@ class OperantConditioningMechanism(Mechanism):
             self.__update_probabilities(self.__got_reward())
 
         # Select a new action (max probability)
-        self.action = self.__select_action()
+        self.action_index = self.__select_action()
+        self.action = self.possibilities[self.action_index]
 
         return [(x, y) for x, y in self.action.iteritems()]
 
@@ -101,29 +121,36 @@ class OperantConditioningMechanism(Mechanism):
         """
         Select the combination of actions with the maximum likelihood of
         resulting in a reward.
-        """
-        values = []
-        total = 0.0
 
-        print self.probabilities.table
+        Combinations are sampled in proportion to their probability times
+        their valuation, from weights that are only changed for the
+        combination that was updated.
 
-        possibilities = self.all_possibilities(self.motor_signals_and_domains)
+        Returns
+        -------
+        int
+            Index of the selected combination in `possibilities`.
+        """
+        if self.weights is None:
+            self.__build_weights()
 
-        for combination in possibilities:
-            v = self.probabilities.get_value(combination) * self.motor_signal_valuation(combination)
-            values.append(v)
+        total = self.weights.total()
+        r = random.random() * total
 
-            total += v
+        i = self.weights.find(r)
+        print "Selected {0}, which had probability {1}".format(self.possibilities[i],
+                                                                 self.weights.get_weight(i) / float(total))
+        return i
 
-        r = random.random() * total
+    def __build_weights(self):
+        self.valuations = [self.motor_signal_valuation(combination) for combination in self.possibilities]
 
-        cumulative = 0.0
-        for i in range(len(values)):
-            cumulative += values[i]
+        # Look all probabilities up at once, with the values in the table's sorted order
+        probabilities = self.probabilities.get_values([tuple(combination[name] for name in sorted(combination))
+                                                       for combination in self.possibilities])
 
-            if cumulative >= r:
-                print "Selected {0}, which had probability {1}".format(possibilities[i], values[i] / float(total))
-                return possibilities[i]
+        self.weight_scale = 1.0
+        self.weights = utils.SumTree([p * valuation for p, valuation in zip(probabilities, self.valuations)])
 
     def __update_probabilities(self, rewarded):
         old = self.probabilities.get_value(self.action)
@@ -137,6 +164,8 @@ class OperantConditioningMechanism(Mechanism):
             new = max(old - self.delta_neg, self.min_probability)
 
         self.probabilities.set_value(self.action, new)
+        if self.weights is not None:
+            self.weights.set_weight(self.action_index, new * self.valuations[self.action_index] * self.weight_scale)
 
         # Renormalize
         self.__normalize(1.0 + (new - old))
@@ -144,7 +173,12 @@ class OperantConditioningMechanism(Mechanism):
         print "Old: {0}, New {1}, Normalized {2}".format(old, new, self.probabilities.get_value(self.action))
 
     def __normalize(self, new_total):
-        self.probabilities.map_function_over_all_values(lambda x: x / float(new_total))
+        self.probabilities.normalize(new_total)
+
+        # Relative weights do not change, so only their scale is kept
+        self.weight_scale *= new_total
+        if not 1 / self.MAX_WEIGHT_SCALE < self.weight_scale < self.MAX_WEIGHT_SCALE:
+            self.weights = None
 
     def __increase_probability(self, combination):
         old = self.probabilities.get_value(self.action)
@@ -169,6 +203,7 @@ class OperantConditioningMechanism(Mechanism):
 
                 if match:
                     new_total += self.__increase_probability(combination)
+            self.weights = None
             print "New {0}".format(new_total)
             self.__normalize(new_total)
         else:
@@ -0,0 +1,370 @@
+__author__ = 'Dennis'
+
+from easl.utils import Graph
+
+import math
+import itertools
+import multiprocessing
+
+
+def _chi_square_survival(x, df):
+    """
+    Probability that a chi-square distributed variable with df degrees of
+    freedom is at least x.
+
+    Calculated as the regularized upper incomplete gamma function Q(df/2, x/2).
+    """
+    a = df / 2.0
+    x /= 2.0
+
+    if x <= 0:
+        return 1.0
+
+    log_prefactor = -x + a * math.log(x) - math.lgamma(a)
+
+    if x < a + 1:
+        # Series of the lower function P(a, x)
+        term = 1.0 / a
+        total = term
+        ap = a
+        for _ in range(1000):
+            ap += 1
+            term *= x / ap
+            total += term
+            if abs(term) < abs(total) * 1e-12:
+                break
+
+        return max(0.0, 1.0 - total * math.exp(log_prefactor))
+    else:
+        # Continued fraction of Q(a, x)
+        tiny = 1e-300
+        b = x + 1 - a
+        c = 1 / tiny
+        d = 1 / b
+        h = d
+        for i in range(1, 1000):
+            an = -i * (i - a)
+            b += 2
+            d = an * d + b
+            if abs(d) < tiny:
+                d = tiny
+            c = b + an / c
+            if abs(c) < tiny:
+                c = tiny
+            d = 1 / d
+            delta = d * c
+            h *= delta
+            if abs(delta - 1) < 1e-12:
+                break
+
+        return math.exp(log_prefactor) * h
+
+
+def _independence_p_value(test):
+    """
+    G-test of conditional independence of two variables.
+
+    Module level so it can be sent to worker processes.
+
+    Parameters
+    ----------
+    test : ({(value): int}, int, int)
+        Counts of the combinations of values of the tested and conditioning
+        variables, and the positions of the two tested variables in them.
+
+    Returns
+    -------
+    float
+        p-value of the hypothesis that the variables are independent.
+    """
+    counts, ix, iy = test
+
+    # Group the counts by the values of the conditioning variables
+    strata = {}
+    for key, n in counts.iteritems():
+        z = tuple(v for i, v in enumerate(key) if i != ix and i != iy)
+        strata.setdefault(z, []).append((key[ix], key[iy], n))
+
+    g = 0.0
+    df = 0
+    for cells in strata.itervalues():
+        n_x = {}
+        n_y = {}
+        total = 0
+        for x, y, n in cells:
+            n_x[x] = n_x.get(x, 0) + n
+            n_y[y] = n_y.get(y, 0) + n
+            total += n
+
+        for x, y, n in cells:
+            if n > 0:
+                g += 2 * n * math.log(n * total / float(n_x[x] * n_y[y]))
+
+        # Only values that were observed add degrees of freedom
+        df += (len(n_x) - 1) * (len(n_y) - 1)
+
+    if df <= 0:
+        return 1.0
+
+    return _chi_square_survival(g, df)
+
+
+class SufficientStatistics(object):
+    """
+    Counts of all complete previous/current entries in one or more Data, and
+    of the combinations of any subset of variables that was asked for.
+
+    Counts of a subset are calculated from the joint counts once, and then
+    kept up to date with every new entry.
+
+    Attributes
+    ----------
+    variables : {string: [string]}
+    motor : [string]
+    order : [string]
+        Variables in the order of the joint counts' keys.
+    joint : {(string): int}
+    marginals : {(string): {(string): int}}
+        For every sorted subset of variables, the counts of its combinations.
+    n : int
+        Number of counted entries.
+    """
+    def __init__(self, variables, motor):
+        self.variables = variables
+        self.motor = motor
+
+        self.order = sorted(variables.keys())
+
+        self.joint = {}
+        self.marginals = {}
+
+        self.n = 0
+
+    def add_entry(self, entry):
+        for x in self.order:
+            if x not in entry:
+                return
+
+        key = tuple(entry[x] for x in self.order)
+        self.joint[key] = self.joint.get(key, 0) + 1
+
+        for names, counts in self.marginals.iteritems():
+            key = tuple(entry[x] for x in names)
+            counts[key] = counts.get(key, 0) + 1
+
+        self.n += 1
+
+    def get_counts(self, names):
+        """
+        Parameters
+        ----------
+        names : [string]
+
+        Returns
+        -------
+        {(string): int}
+            Counts of the combinations of values of the variables, in sorted order.
+        """
+        names = tuple(sorted(names))
+
+        if names not in self.marginals:
+            indices = [self.order.index(x) for x in names]
+
+            counts = {}
+            for key, n in self.joint.iteritems():
+                marginal = tuple(key[i] for i in indices)
+                counts[marginal] = counts.get(marginal, 0) + n
+
+            self.marginals[names] = counts
+
+        return self.marginals[names]
+
+
+class StructureLearner(object):
+    """
+    Learns a causal network from SufficientStatistics with the PC algorithm.
+
+    The skeleton is found by removing the edge between every pair of nodes
+    that is conditionally independent given some set of nodes adjacent to
+    either, with increasingly large conditioning sets.
+    Within a level all tests are taken against the same adjacencies, so that
+    they do not depend on each other and can run in a process pool, which
+    is closed again at the end of every learning step.
+
+    Edges are oriented from earlier to later tiers, then by the unshielded
+    colliders, and otherwise from the lower to the higher numbered node,
+    never closing a cycle.
+
+    Learning is incremental: an edge is only tested again once the number of
+    counted entries grew by `retest_fraction` since its last test, or when
+    an edge next to it changed.
+
+    Attributes
+    ----------
+    statistics : SufficientStatistics
+    nodes : [string]
+    tiers : {string: int}
+        Time slice of every node; edges never point to an earlier tier.
+    numbering : {string: int}
+    alpha : float
+        Significance level below which variables are considered dependent.
+    max_level : int
+        Maximum size of conditioning sets.
+    processes : int
+        Number of worker processes for the tests, or None to test in this process.
+    retest_fraction : float
+    skeleton : set(frozenset)
+        Pairs of adjacent nodes.
+    sepsets : {frozenset: (string)}
+        Conditioning set that separates every pair of non-adjacent nodes.
+    tested_at : {frozenset: int}
+        Number of counted entries when a pair was last tested.
+    graph : Graph
+    """
+    def __init__(self, statistics, tiers, numbering, alpha=0.05, max_level=2, processes=None, retest_fraction=0.1):
+        self.statistics = statistics
+        self.nodes = statistics.order
+
+        self.tiers = tiers
+        self.numbering = numbering
+
+        self.alpha = alpha
+        self.max_level = max_level
+        self.processes = processes
+        self.retest_fraction = retest_fraction
+
+        self.skeleton = set()
+        self.sepsets = {}
+        self.tested_at = {}
+
+        self.graph = None
+
+    def learn(self):
+        """
+        Learns the network from scratch.
+
+        Returns
+        -------
+        Graph
+        """
+        self.skeleton = set()
+        self.sepsets = {}
+
+        self.__test_pairs([frozenset(pair) for pair in itertools.combinations(self.nodes, 2)])
+
+        self.graph = self.__orient()
+        return self.graph
+
+    def update(self):
+        """
+        Tests only the pairs of nodes of which the counts changed enough since
+        their last test.
+
+        Returns
+        -------
+        Graph
+        """
+        if self.graph is None:
+            return self.learn()
+
+        n = self.statistics.n
+        stale = [pair for pair, tested in self.tested_at.iteritems()
+                 if n - tested > 0 and n - tested >= self.retest_fraction * tested]
+
+        if len(stale) == 0:
+            return self.graph
+
+        before = set(self.skeleton)
+        self.__test_pairs(stale)
+
+        # Pairs next to a changed edge are tested again at the next update
+        for pair in before ^ self.skeleton:
+            for other in self.tested_at:
+                if len(other & pair) > 0 and other != pair:
+                    self.tested_at[other] = 0
+
+        self.graph = self.__orient()
+        return self.graph
+
+    def __test_pairs(self, pairs):
+        for pair in pairs:
+            self.skeleton.add(pair)
+            self.sepsets.pop(pair, None)
+            self.tested_at[pair] = self.statistics.n
+
+        pending = set(pairs)
+        level = 0
+        pool = None
+
+        try:
+            while len(pending) > 0 and level <= self.max_level:
+                adjacencies = {node: self.__adjacent(node) for node in self.nodes}
+
+                tests = []
+                for pair in sorted(pending, key=sorted):
+                    x, y = sorted(pair)
+                    conditions = set(itertools.combinations(sorted(adjacencies[x] - {y}), level))
+                    conditions |= set(itertools.combinations(sorted(adjacencies[y] - {x}), level))
+
+                    # Adjacencies only shrink, so there will be no larger conditioning sets either
+                    if len(conditions) == 0:
+                        pending.discard(pair)
+
+                    for z in sorted(conditions):
+                        tests.append((pair, x, y, z))
+
+                prepared = [self.__prepare_test(x, y, z) for _, x, y, z in tests]
+                if self.processes is None or len(prepared) < 2:
+                    p_values = map(_independence_p_value, prepared)
+                else:
+                    if pool is None:
+                        pool = multiprocessing.Pool(self.processes)
+                    p_values = pool.map(_independence_p_value, prepared)
+
+                for (pair, x, y, z), p in zip(tests, p_values):
+                    if p > self.alpha and pair in self.skeleton:
+                        self.skeleton.discard(pair)
+                        self.sepsets[pair] = z
+                        pending.discard(pair)
+
+                level += 1
+        finally:
+            # Workers would otherwise outlive the simulation
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def __prepare_test(self, x, y, z):
+        names = sorted((x, y) + z)
+
+        return self.statistics.get_counts(names), names.index(x), names.index(y)
+
+    def __adjacent(self, node):
+        return set(other for pair in self.skeleton if node in pair for other in pair if other != node)
+
+    def __orient(self):
+        graph = Graph()
+        for node in self.nodes:
+            graph.add_node(node)
+
+        # Unshielded colliders x -> z <- y, where z does not separate x and y
+        colliders = set()
+        for z in self.nodes:
+            for x, y in itertools.combinations(sorted(self.__adjacent(z)), 2):
+                pair = frozenset((x, y))
+                if pair not in self.skeleton and z not in self.sepsets.get(pair, ()):
+                    colliders.add((x, z))
+                    colliders.add((y, z))
+
+        for pair in sorted(self.skeleton, key=lambda p: sorted(self.numbering.get(node, 0) for node in p)):
+            a, b = sorted(pair, key=lambda node: (self.tiers.get(node, 0), self.numbering.get(node, 0)))
+
+            if self.tiers.get(a, 0) == self.tiers.get(b, 0) and (b, a) in colliders and (a, b) not in colliders:
+                a, b = b, a
+
+            if graph.has_path(b, a):
+                a, b = b, a
+
+            graph.add_edge(a, b)
+
+        return graph
@@ -5,6 +5,7 @@ import csv
 
 from world import World
 from log import Log
+from utils import merge_tables
 
 
 class SimulationSetting(object):
@@ -27,11 +28,19 @@ class SimulationSuite(object):
     visualizer : Visualizer
         Visualizer that will be used for the simulations.
     simulations : [SimulationSettings]
+    model_collection : {string: function : Table}
+        For every entity name, a function that takes its agent after a
+        simulation and returns a count table of what it learned.
+    models : {string: {string: [Table]}}
+        For every simulation's file name and entity name, the collected
+        table of every run.
 
     Methods
     -------
     run_simulations
         Runs all configured simulations.
+    get_population_model
+        Merges the tables collected over all runs of a simulation.
     """
     def __init__(self):
         self.visualizer = None
@@ -47,6 +56,9 @@ class SimulationSuite(object):
         self.constant_data_collection = {}
         self.bins = -1
 
+        self.model_collection = {}
+        self.models = {}
+
     def set_visualizer(self, visualizer):
         self.visualizer = visualizer
 
@@ -138,6 +150,29 @@ class SimulationSuite(object):
             log.make_data(file_name, self.constant_data_collection, number)
             Log.make_bins(file_name, self.constant_data_collection.values(), self.bins, number)
 
+            for entity_name in self.model_collection:
+                if entity_name in world.entities and world.entities[entity_name].agent is not None:
+                    table = self.model_collection[entity_name](world.entities[entity_name].agent)
+                    self.models.setdefault(file_name, {}).setdefault(entity_name, []).append(table)
+
+    def get_population_model(self, file_name, entity_name, processes=None):
+        """
+        Parameters
+        ----------
+        file_name : string
+            Name of the simulation, as used for its data files.
+        entity_name : string
+        processes : int
+            Number of worker processes to merge in, or None to merge in this process.
+
+        Returns
+        -------
+        Table
+            Sum of the tables collected from the entity over all runs of the
+            simulation, or None if none were collected.
+        """
+        return merge_tables(self.models.get(file_name, {}).get(entity_name, []), processes)
+
     def create_all_settings(self):
         settings = []
         updated_settings = []
@@ -206,6 +241,17 @@ class SimulationSuite(object):
         """
         self.constant_data_collection.update(dict(zip(attribute_names, column_labels)))
 
+    def add_model_collection(self, entity_name, f):
+        """
+        Parameters
+        ----------
+        entity_name : string
+        f : function agent: Table
+            Returns the count table to pool over runs from the entity's agent,
+            e.g. the frequencies of a causal learning mechanism.
+        """
+        self.model_collection[entity_name] = f
+
     def add_initial_triggers(self, triggers):
         self.initial_triggers.update(triggers)
 
@@ -1,7 +1,19 @@
 __author__ = 'Dennis'
 
 from probability import FullTable
+from probability import FlatFullTable
 from probability import Table
 from probability import SparseTable
 from probability import SparseConditionalTable
+from probability import DenseTable
+from probability import DenseConditionalTable
+from probability import CountMinTable
+from probability import CountMinConditionalTable
 from probability import Distribution
+from probability import merge_tables
+from storage import save_table
+from storage import load_table
+from graph import Graph
+from factor import Factor
+from search import branch_and_bound
+from search import SumTree
@@ -0,0 +1,210 @@
+__author__ = 'Dennis'
+
+import numpy as np
+
+
+class Factor(object):
+    """
+    Function from the combinations of values of a set of variables to
+    numbers, stored as an ndarray with one named axis per variable.
+
+    All operations return a new Factor and work on the whole array at once.
+
+    Attributes
+    ----------
+    variables : [name]
+        Names of the axes, in order.
+    domains : {name: [value]}
+        Values of every variable, in the order of their axis.
+    values : ndarray
+    """
+    def __init__(self, variables, domains, values=None):
+        """
+        Parameters
+        ----------
+        variables : [name]
+        domains : {name: [value]}
+            Should at least contain the variables.
+        values : ndarray, optional
+            Values with the axes in the order of `variables`; zeros if not given.
+        """
+        self.variables = list(variables)
+        self.domains = {name: domains[name] for name in self.variables}
+
+        shape = tuple(len(self.domains[name]) for name in self.variables)
+        if values is None:
+            self.values = np.zeros(shape)
+        elif np.shape(values) != shape:
+            raise IndexError("Values of shape {0} do not fit a factor of shape {1}".format(np.shape(values), shape))
+        else:
+            self.values = np.asarray(values)
+
+    @staticmethod
+    def from_table(table):
+        """
+        Parameters
+        ----------
+        table : DenseTable or SparseTable
+
+        Returns
+        -------
+        Factor
+            Factor with the values of the table, with the axes in sorted order.
+        """
+        domains = table.get_variables()
+        variables = sorted(domains.keys())
+
+        if hasattr(table, "shape"):
+            return Factor(variables, domains, table.table)
+
+        factor = Factor(variables, domains)
+        for entry, value in table.iter_nonzero_entries():
+            factor.values[factor.index(entry)] = value
+
+        return factor
+
+    def index(self, row):
+        """
+        Parameters
+        ----------
+        row : {name: value}
+
+        Returns
+        -------
+        (int)
+            Position of the row in `values`.
+        """
+        return tuple(self.domains[name].index(row[name]) for name in self.variables)
+
+    def get_value(self, row):
+        return self.values[self.index(row)]
+
+    def product(self, other):
+        """
+        Pointwise product, over the union of both factors' variables.
+        """
+        variables = self.variables + [name for name in other.variables if name not in self.variables]
+
+        domains = dict(self.domains)
+        domains.update(other.domains)
+
+        axes = {name: i for i, name in enumerate(variables)}
+        values = np.einsum(self.values, [axes[name] for name in self.variables],
+                           other.values, [axes[name] for name in other.variables],
+                           range(len(variables)))
+
+        return Factor(variables, domains, values)
+
+    def sum_out(self, names):
+        """
+        Parameters
+        ----------
+        names : [name]
+            Variables to marginalize over.
+        """
+        axes = tuple(i for i, name in enumerate(self.variables) if name in names)
+        variables = [name for name in self.variables if name not in names]
+
+        return Factor(variables, self.domains, self.values.sum(axis=axes))
+
+    def reduce(self, evidence):
+        """
+        Parameters
+        ----------
+        evidence : {name: value}
+            Values of some variables; variables that are not in the factor are ignored.
+
+        Returns
+        -------
+        Factor
+            Only the values that agree with the evidence, over the other variables.
+        """
+        index = tuple(self.domains[name].index(evidence[name]) if name in evidence else slice(None)
+                      for name in self.variables)
+        variables = [name for name in self.variables if name not in evidence]
+
+        return Factor(variables, self.domains, self.values[index])
+
+    def normalize(self, conditioned=None):
+        """
+        Parameters
+        ----------
+        conditioned : [name], optional
+            Variables that are conditioned on the rest; all if not given.
+
+        Returns
+        -------
+        Factor
+            The values divided by their sum over the conditioned variables,
+            or zero where that sum is zero.
+        """
+        if conditioned is None:
+            conditioned = self.variables
+
+        values = self.values.astype(float)
+        axes = tuple(i for i, name in enumerate(self.variables) if name in conditioned)
+        totals = values.sum(axis=axes, keepdims=True)
+
+        normalized = np.zeros(values.shape)
+        np.divide(values, totals, out=normalized, where=np.broadcast_to(totals > 0, values.shape))
+
+        return Factor(self.variables, self.domains, normalized)
+
+    def transpose(self, variables):
+        """
+        Parameters
+        ----------
+        variables : [name]
+            All of the factor's variables, in the new order of the axes.
+        """
+        return Factor(variables, self.domains, np.transpose(self.values, [self.variables.index(name)
+                                                                          for name in variables]))
+
+    @staticmethod
+    def eliminate(factors, query, evidence=None):
+        """
+        Variable elimination.
+
+        Parameters
+        ----------
+        factors : [Factor]
+        query : [name]
+            Variables to keep.
+        evidence : {name: value}, optional
+            Values to reduce all factors by first.
+
+        Returns
+        -------
+        Factor
+            Sum over all other variables of the product of the factors, with
+            the axes in the order of `query`.
+        """
+        if evidence is not None:
+            factors = [factor.reduce(evidence) for factor in factors]
+        factors = list(factors)
+
+        hidden = set(name for factor in factors for name in factor.variables if name not in query)
+
+        while len(hidden) > 0:
+            # Eliminate the variable that gives the smallest intermediate factor first
+            def size(name):
+                names = set(n for factor in factors if name in factor.variables for n in factor.variables)
+                domains = dict(d for factor in factors for d in factor.domains.iteritems())
+                return np.prod([len(domains[n]) for n in names])
+
+            name = min(sorted(hidden), key=size)
+            hidden.remove(name)
+
+            involved = [factor for factor in factors if name in factor.variables]
+            factors = [factor for factor in factors if name not in factor.variables]
+
+            product = involved[0]
+            for factor in involved[1:]:
+                product = product.product(factor)
+            factors.append(product.sum_out([name]))
+
+        result = factors[0]
+        for factor in factors[1:]:
+            result = result.product(factor)
+
+        return result.transpose([name for name in query if name in result.variables])
@@ -0,0 +1,140 @@
+__author__ = 'Dennis'
+
+import math
+
+
+class Graph(object):
+    """
+    Directed graph of named nodes.
+
+    Attributes
+    ----------
+    nodes : [name]
+    edges : [(name, name)]
+        Edges from the first to the second node.
+    """
+    def __init__(self):
+        self.nodes = []
+        self.edges = []
+
+        self.children = {}
+        self.parents = {}
+
+    def add_node(self, node):
+        if node in self.children:
+            return
+
+        self.nodes.append(node)
+        self.children[node] = []
+        self.parents[node] = []
+
+    def add_edge(self, a, b):
+        if self.has_edge(a, b):
+            return
+
+        self.add_node(a)
+        self.add_node(b)
+
+        self.edges.append((a, b))
+        self.children[a].append(b)
+        self.parents[b].append(a)
+
+    def remove_edge(self, a, b):
+        if not self.has_edge(a, b):
+            return
+
+        self.edges.remove((a, b))
+        self.children[a].remove(b)
+        self.parents[b].remove(a)
+
+    def has_edge(self, a, b):
+        return a in self.children and b in self.children[a]
+
+    def has_path(self, a, b):
+        """
+        True if b can be reached from a by following edges.
+        """
+        visited = set()
+        stack = [a]
+
+        while len(stack) > 0:
+            node = stack.pop()
+            if node == b:
+                return True
+            if node in visited:
+                continue
+
+            visited.add(node)
+            stack.extend(self.children.get(node, []))
+
+        return False
+
+    def get_nodes(self):
+        return self.nodes
+
+    def get_edges(self):
+        return self.edges
+
+    def get_parents(self, node):
+        return self.parents[node]
+
+    def get_children(self, node):
+        return self.children[node]
+
+    def visualize(self):
+        """
+        Prints all edges.
+        """
+        for a, b in self.edges:
+            print "{0} -> {1}".format(a, b)
+
+    @staticmethod
+    def arc_layout(n):
+        """
+        Grid positions of n nodes on a quarter circle, in the top left of an
+        n by n grid.
+
+        Returns
+        -------
+        [(int, int)]
+        """
+        if n == 1:
+            return [(0, 0)]
+
+        layout = []
+        for i in range(n):
+            angle = math.pi / 2 * i / float(n - 1)
+            layout.append((int(round((n - 1) * (1 - math.cos(angle)))),
+                           int(round((n - 1) * (1 - math.sin(angle))))))
+
+        return layout
+
+    @staticmethod
+    def flipped_layout_both(layout, n):
+        """
+        Mirrors a layout of n nodes to the opposite corner of a 2n by 2n grid.
+
+        Parameters
+        ----------
+        layout : [(int, int)]
+            Layout to flip; an arc layout is used when it has less than n positions.
+        """
+        if len(layout) < n:
+            layout = Graph.arc_layout(n)
+
+        return [(2 * n - 1 - x, 2 * n - 1 - y) for x, y in layout]
+
+    @staticmethod
+    def flipped_layout_vertical(layout, n):
+        """
+        Mirrors a layout of n nodes in the vertical axis of a 2n by 2n grid.
+
+        Parameters
+        ----------
+        layout : [(int, int)]
+            Layout to flip; an arc layout is used when it has less than n positions.
+        """
+        if len(layout) < n:
+            layout = Graph.arc_layout(n)
+
+        return [(2 * n - 1 - x, y) for x, y in layout]
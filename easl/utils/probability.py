@@ -1,7 +1,147 @@
 __author__ = 'Dennis'
 
 from copy import deepcopy
-import itertools
+import math
+import multiprocessing
+import random
+import sys
+
+import numpy as np
+
+
+def _merge_pair(pair):
+    """
+    Module level so it can be sent to worker processes.
+    """
+    a, b = pair
+    return a.merge(b)
+
+
+def merge_tables(tables, processes=None):
+    """
+    Merges tables by a tree reduction, merging pairs of tables level by
+    level, so that every level can run in a process pool.
+
+    Parameters
+    ----------
+    tables : [Table]
+        Tables of the same type, variables and values.
+    processes : int
+        Number of worker processes, or None to merge in this process.
+
+    Returns
+    -------
+    Table
+        Table with the sum of the values of all tables, or None if there are none.
+    """
+    tables = list(tables)
+    if len(tables) == 0:
+        return None
+
+    pool = None
+    if processes is not None and len(tables) > 2:
+        pool = multiprocessing.Pool(processes)
+
+    try:
+        while len(tables) > 1:
+            pairs = zip(tables[0::2], tables[1::2])
+            rest = tables[-1:] if len(tables) % 2 == 1 else []
+
+            if pool is None:
+                merged = map(_merge_pair, pairs)
+            else:
+                merged = pool.map(_merge_pair, pairs)
+
+            tables = merged + rest
+    finally:
+        if pool is not None:
+            pool.close()
+
+    return tables[0]
+
+
+def _fitting_dtype(dtype, values):
+    """
+    Returns
+    -------
+    dtype
+        The type, or the narrowest wider type that holds all values, e.g.
+        uint32 for uint16 counts above 65535, or float for fractions.
+    """
+    values = np.asarray(values)
+    if values.size == 0:
+        return np.dtype(dtype)
+
+    return np.result_type(dtype, values.min(), values.max())
+
+
+def _promoted(array, values):
+    """
+    Returns
+    -------
+    ndarray
+        The array, converted to a type that also holds the values if needed.
+    """
+    dtype = _fitting_dtype(array.dtype, values)
+    if dtype == array.dtype:
+        return array
+
+    return array.astype(dtype)
+
+
+def _promoted_for_additions(array, flat, amounts):
+    """
+    Returns
+    -------
+    ndarray
+        The array, converted to a type that holds its values after adding the
+        amounts at the flat indices, where an index can occur more than once.
+    """
+    amounts = np.asarray(amounts)
+    if array.dtype.itemsize >= 8 and np.can_cast(amounts.dtype, array.dtype):
+        return array
+
+    amounts = np.broadcast_to(amounts, flat.shape)
+    if amounts.size == 0:
+        return array
+
+    unique, inverse = np.unique(flat, return_inverse=True)
+    sums = np.zeros(len(unique), dtype=np.result_type(array, amounts, np.int64))
+    np.add.at(sums, inverse, amounts)
+
+    return _promoted(array, array.flat[unique] + sums)
+
+
+def _fitting_sum(a, b):
+    """
+    Returns
+    -------
+    ndarray
+        a + b, in a's type or the narrowest wider type that holds the sums.
+    """
+    if a.dtype.itemsize >= 8 and np.can_cast(b.dtype, a.dtype):
+        return np.asarray(a + b)
+
+    sums = np.asarray(a.astype(np.result_type(a, b, np.int64)) + b)
+    return sums.astype(_fitting_dtype(a.dtype, sums))
+
+
+def _container_nbytes(container):
+    """
+    Size in bytes of a dict or set with its keys and values, not counting the
+    values of the variables within keys, which are shared with the domains.
+    """
+    size = sys.getsizeof(container)
+
+    if isinstance(container, dict):
+        for key, value in container.iteritems():
+            size += sys.getsizeof(key)
+            size += _container_nbytes(value) if isinstance(value, (dict, set)) else sys.getsizeof(value)
+    else:
+        for key in container:
+            size += sys.getsizeof(key)
+
+    return size
 
 
 class Table(object):
@@ -42,6 +182,105 @@ class Table(object):
         """
         raise NotImplementedError()
 
+    def get_values(self, rows):
+        """
+        Parameters
+        ----------
+        rows : ndarray or [(str)]
+            Either an integer array with one row of value indices per row, or
+            a list of tuples of values; both with the columns in sorted order.
+
+        Returns
+        -------
+        ndarray
+            The value of every row.
+        """
+        return np.array([self.get_value(row) for row in self._decode_rows(rows)])
+
+    def add_values(self, rows, amounts=1):
+        """
+        Adds to the value of every row.
+
+        Parameters
+        ----------
+        rows : ndarray or [(str)]
+            See `get_values`.
+        amounts : number or ndarray
+            Amount to add to every row, or one amount per row.
+        """
+        rows = self._decode_rows(rows)
+        amounts = np.broadcast_to(amounts, (len(rows),))
+
+        for row, amount in zip(rows, amounts):
+            self.set_value(row, self.get_value(row) + amount)
+
+    def merge(self, other):
+        """
+        Sum of the values of this and another table of the same type, over the
+        same variables and values.
+
+        Merging is associative and commutative, and an empty table is its
+        identity, so partial tables can be combined in any grouping, as by
+        `merge_tables`.
+
+        Parameters
+        ----------
+        other : Table
+
+        Returns
+        -------
+        Table
+            New table; neither table is changed.
+        """
+        if type(other) is not type(self):
+            raise RuntimeError("Can only merge tables of the same type.")
+        if other._column_names != self._column_names:
+            raise RuntimeError("Can only merge tables with the same variables and values.")
+
+        merged = deepcopy(self)
+        merged._add_table(other)
+
+        return merged
+
+    def _add_table(self, other):
+        """
+        Adds the values of a table with the same schema to this table.
+        """
+        raise NotImplementedError()
+
+    def memory_report(self):
+        """
+        Returns
+        -------
+        {str: int}
+            Size in bytes of every part of the table that holds data.
+        """
+        raise NotImplementedError()
+
+    def nbytes(self):
+        """
+        Returns
+        -------
+        int
+            Size in bytes of all data of the table.
+        """
+        return sum(self.memory_report().values())
+
+    def _decode_rows(self, rows):
+        """
+        Returns
+        -------
+        [{str: str}]
+            Rows of `get_values` as column name/value pairs.
+        """
+        columns = sorted(self._column_names.keys())
+
+        if isinstance(rows, np.ndarray) and rows.dtype.kind in "iu":
+            domains = [self._column_names[name] for name in columns]
+            return [{name: domain[i] for name, domain, i in zip(columns, domains, row)} for row in rows]
+
+        return [dict(zip(columns, row)) for row in rows]
+
 
 class FullTable(Table):
     def __init__(self, column_names):
@@ -150,8 +389,35 @@ class FullTable(Table):
             for value in current:
                 self.__map_function_over_all_values_recursive(f, current[value], order[1:])
 
+    def _add_table(self, other):
+        self.__add_table_recursive(self.table, other.table, self.order)
+
+    def __add_table_recursive(self, current, other, order):
+        if len(order) == 0:
+            for value in current:
+                current[value] += other[value]
+        else:
+            for value in current:
+                self.__add_table_recursive(current[value], other[value], order[1:])
+
+    def memory_report(self):
+        return {"table": _container_nbytes(self.table)}
+
 
 class SparseTable(Table):
+    """
+    Stores only the values of the combinations that were set, in a dict
+    keyed by the tuple of the combination's values in `columns` order.
+
+    Attributes
+    ----------
+    table : {(value): value}
+    order : [name]
+        All variables except `last`, sorted.
+    last : name
+    columns : [name]
+        `order` followed by `last`; the order of the values in the keys.
+    """
     def __init__(self, column_names):
         super(SparseTable, self).__init__(column_names)
 
@@ -163,146 +429,614 @@ class SparseTable(Table):
 
         self.last = self.order.pop()
 
+        self.columns = self.order + [self.last]
+
     def get_variables(self):
         return self._column_names.copy()
 
-    def __make_entry(self, entry):
-        current = self.table
+    def key(self, row):
+        """
+        Parameters
+        ----------
+        row : {name: value}
 
-        for name in self.order:
-            if entry[name] in current:
-                current = current[entry[name]]
-                continue
-            else:
-                current[entry[name]] = {}
-                current = current[entry[name]]
-                continue
+        Returns
+        -------
+        (value)
+            Key of the row in `table`.
+        """
+        return tuple(row[name] for name in self.columns)
+
+    def set_value(self, row, value):
+        self.table[self.key(row)] = value
 
-        current[entry[self.last]] = 0
+    def inc_value(self, vals):
+        """
+        Parameters
+        ----------
+        vals : {name: value}
+        """
+        key = self.key(vals)
+        self.table[key] = self.table.get(key, 0) + 1
+
+    def get_value(self, row):
+        """
+        Parameters
+        ----------
+        vals : {name: value}
+        """
+        return self.table.get(self.key(row), 0)
+
+    def get_values(self, rows):
+        table = self.table
+        return np.array([table.get(key, 0) for key in self.__keys(rows)])
+
+    def add_values(self, rows, amounts=1):
+        table = self.table
+        for key, amount in zip(self.__keys(rows), np.broadcast_to(amounts, (len(rows),))):
+            table[key] = table.get(key, 0) + amount
+
+    def __keys(self, rows):
+        if isinstance(rows, np.ndarray) and rows.dtype.kind in "iu":
+            domains = [self._column_names[name] for name in self.columns]
+            return [tuple(domain[i] for domain, i in zip(domains, row)) for row in rows]
+
+        return [tuple(row) for row in rows]
+
+    def _add_table(self, other):
+        table = self.table
+        for key, value in other.table.iteritems():
+            table[key] = table.get(key, 0) + value
+
+    def memory_report(self):
+        return {"table": _container_nbytes(self.table)}
+
+    def get_nonzero_entries(self):
+        return [entry for entry, _ in self.iter_nonzero_entries()]
+
+    def iter_nonzero_entries(self):
+        """
+        Yields
+        ------
+        ({name: value}, value)
+            Every combination with a non-zero value, and the value.
+        """
+        columns = self.columns
+        for key, value in self.table.iteritems():
+            if value != 0:
+                yield dict(zip(columns, key)), value
+
+    def do_operation(self, f):
+        """
+        Perform function f(x) on every element.
+
+        Parameters
+        ----------
+        f : function x: f(x)
+        """
+        table = self.table
+        for key in table:
+            table[key] = f(table[key])
+
+
+class SparseConditionalTable(SparseTable):
+    """
+    Sparse table of conditional values, that also keeps track of which values
+    of the conditional variables have data.
+
+    Attributes
+    ----------
+    conditional : {name: [value]}
+        The variables that are conditioned on.
+    conditional_order : [name]
+        The conditional variables in sorted order.
+    conditioning : set((value))
+        Values of the conditional variables, in `conditional_order`, of
+        every combination that was set.
+    """
+    def __init__(self, column_names, conditional):
+        super(SparseConditionalTable, self).__init__(column_names)
+
+        self.conditional = conditional
+        self.conditional_order = sorted(conditional.keys())
+
+        self.conditioning = set()
+
+    def conditional_key(self, row):
+        """
+        Parameters
+        ----------
+        row : {name: value}
+            Values of (at least) the conditional variables.
+
+        Returns
+        -------
+        (value)
+            Key of the values of the conditional variables in `conditioning`.
+        """
+        return tuple(row[name] for name in self.conditional_order)
 
     def set_value(self, row, value):
-        current = self.table
+        super(SparseConditionalTable, self).set_value(row, value)
 
-        for name in self.order:
-            if row[name] not in current:
-                self.__make_entry(row)
-                # try again, but now the entry exists
-                self.set_value(row, value)
-                return
+        self.conditioning.add(self.conditional_key(row))
 
-            current = current[row[name]]
+    def add_values(self, rows, amounts=1):
+        super(SparseConditionalTable, self).add_values(rows, amounts)
 
-        if row[self.last] not in current:
-            self.__make_entry(row)
-            self.set_value(row, value)
-            return
-        else:
-            current[row[self.last]] = value
+        for row in self._decode_rows(rows):
+            self.conditioning.add(self.conditional_key(row))
 
-    def inc_value(self, vals):
+    def _add_table(self, other):
+        super(SparseConditionalTable, self)._add_table(other)
+
+        self.conditioning |= other.conditioning
+
+    def memory_report(self):
+        report = super(SparseConditionalTable, self).memory_report()
+        report["conditioning"] = _container_nbytes(self.conditioning)
+
+        return report
+
+    def has_data(self, conditional):
+        return self.conditional_key(conditional) in self.conditioning
+
+
+class DenseTable(Table):
+    """
+    Stores the values of all K^N combinations in a single ndarray, with one
+    axis per variable in sorted order.
+
+    Values of a variable are encoded as their index in its list of values, so
+    that a row is a mixed-radix number over the variables' domain sizes.
+    As the array holds every combination, this is only feasible for tables
+    of which the full size fits in memory.
+
+    Attributes
+    ----------
+    order : [name]
+        Variables in the order of the axes.
+    indices : {name: {value: int}}
+        Encoding of every variable's values.
+    shape : (int)
+    table : ndarray
+        Values, of the given type until a value does not fit it, when the
+        table is converted to the narrowest wider type that holds it.
+    """
+    def __init__(self, column_names, values=None, dtype=float):
         """
         Parameters
         ----------
-        vals : {name: value}
+        column_names : {str: [str]}
+            See Table.
+        values : ndarray, optional
+            Initial values, with the axes in the order of the sorted variables.
+        dtype : type
+            Type of the values when no initial values are given, e.g.
+            np.float32, or np.uint16 for counts.
         """
-        # Go down the path taking the turn appropriate for the value in the
-        # entry.
-        # Then increment.
-        current = self.table
+        super(DenseTable, self).__init__(column_names)
 
-        for name in self.order:
-            if vals[name] not in current:
-                self.__make_entry(vals)
-                self.set_value(vals, 1)
-                return
+        self.order = list(self._column_names.keys())
+        self.order.sort()
 
-            current = current[vals[name]]
+        self.indices = {name: {value: i for i, value in enumerate(self._column_names[name])}
+                        for name in self.order}
+        self.shape = tuple(len(self._column_names[name]) for name in self.order)
 
-        if vals[self.last] not in current:
-            self.__make_entry(vals)
-            self.set_value(vals, 1)
-            return
+        if values is None:
+            self.table = np.zeros(self.shape, dtype=dtype)
+        elif values.shape != self.shape:
+            raise IndexError("Values of shape {0} do not fit a table of shape {1}".format(values.shape, self.shape))
         else:
-            current[vals[self.last]] += 1
+            self.table = values
 
-    def get_value(self, row):
+    def get_variables(self):
+        return self._column_names.copy()
+
+    def encode(self, row):
         """
         Parameters
         ----------
-        vals : {name: value}
+        row : {name: value}
+
+        Returns
+        -------
+        (int)
+            Index of the row in `table`.
         """
-        current = self.table
+        return tuple(self.indices[name][row[name]] for name in self.order)
 
-        for name in self.order:
-            if row[name] not in current:
-                return 0
+    def encode_rows(self, rows):
+        """
+        Parameters
+        ----------
+        rows : [{name: value}]
 
-            current = current[row[name]]
+        Returns
+        -------
+        ndarray
+            One row of value indices per row, in the order of the variables.
+        """
+        codes = np.zeros((len(rows), len(self.order)), dtype=np.intp)
 
-        if row[self.last] not in current:
-            return 0
+        for i, name in enumerate(self.order):
+            index = self.indices[name]
+            codes[:, i] = [index[row[name]] for row in rows]
+
+        return codes
+
+    def get_value(self, row):
+        return self.table[self.encode(row)]
+
+    def set_value(self, row, value):
+        self.table = _promoted(self.table, value)
+        self.table[self.encode(row)] = value
+
+    def inc_value(self, vals):
+        self.add_value(vals, 1)
+
+    def add_value(self, row, amount):
+        index = self.encode(row)
+        value = self.table[index] + amount
+
+        self.table = _promoted(self.table, value)
+        self.table[index] = value
+
+    def get_values(self, rows):
+        return self.table[self.__indices(rows)]
+
+    def add_values(self, rows, amounts=1):
+        indices = self.__indices(rows)
+
+        self.table = _promoted_for_additions(self.table, np.ravel_multi_index(indices, self.shape), amounts)
+        np.add.at(self.table, indices, amounts)
+
+    def __indices(self, rows):
+        if isinstance(rows, np.ndarray) and rows.dtype.kind in "iu":
+            codes = rows
         else:
-            v = current[row[self.last]]
-            return v
+            codes = np.array([[self.indices[name][value] for name, value in zip(self.order, row)] for row in rows],
+                             dtype=np.intp).reshape(-1, len(self.order))
+
+        return tuple(codes.T)
+
+    def _add_table(self, other):
+        self.table = _fitting_sum(self.table, other.table)
+
+    def memory_report(self):
+        return {"table": self.table.nbytes}
+
+    def add_counts(self, codes):
+        """
+        Increments the value of every encoded row by one.
+
+        Parameters
+        ----------
+        codes : ndarray
+            See `encode_rows`.
+        """
+        flat = np.ravel_multi_index(tuple(codes.T), self.shape)
+        counts = np.bincount(flat, minlength=self.table.size).reshape(self.shape)
+
+        self.table = _fitting_sum(self.table, counts)
 
     def get_nonzero_entries(self):
-        return self.__get_nonzero_entries_rec(self.table, self.order, {})
+        entries = []
+        for index in zip(*np.nonzero(self.table)):
+            entries.append({name: self._column_names[name][i] for name, i in zip(self.order, index)})
 
-    def __get_nonzero_entries_rec(self, current, order, entry):
-        if len(order) == 0:
-            for value in current:
-                new_entry = deepcopy(entry)
-                new_entry[self.last] = value
+        return entries
+
+    def do_operation(self, f):
+        """
+        Perform function f(x) on every element.
+
+        Parameters
+        ----------
+        f : function x: f(x)
+            Is applied to the whole array at once.
+        """
+        result = f(self.table)
 
-                return [new_entry]
+        if np.isscalar(result):
+            self.table = np.full(self.shape, result)
         else:
-            entries = []
-            for value in current:
-                new_entry = deepcopy(entry)
-                new_entry[order[0]] = value
+            self.table = np.asarray(result)
 
-                entries += self.__get_nonzero_entries_rec(current[value], order[1:], new_entry)
 
-            return entries
+class FlatFullTable(DenseTable):
+    """
+    Drop-in replacement of FullTable that stores the values of all K^N
+    combinations in the array of a DenseTable instead of a tree of dicts,
+    so operations over all values are array operations.
+    """
+    def increment_value(self, vals):
+        """
+        Parameters
+        ----------
+        vals : {name: value}
+        """
+        self.add_value(vals, 1)
 
-    def do_operation(self, f):
+    def map_function_over_all_values(self, f):
         """
         Perform function f(x) on every element.
 
         Parameters
         ----------
         f : function x: f(x)
+            Is applied to the whole array at once.
         """
-        self.__do_operation_rec(f, self.table, self.order)
+        result = f(self.table)
+        self.table = _promoted(self.table, result)
 
-    def __do_operation_rec(self, f, current, order):
-        if len(order) == 0:
-            for value in current:
-                current[value] = f(current[value])
+        if np.isscalar(result):
+            self.table.fill(result)
         else:
-            for value in current:
-                self.__do_operation_rec(f, current[value], order[1:])
+            self.table[...] = result
 
+    def sum(self):
+        return self.table.ravel().sum()
 
-class SparseConditionalTable(SparseTable):
-    def __init__(self, column_names, conditional):
-        super(SparseConditionalTable, self).__init__(column_names)
+    def normalize(self, total=None):
+        """
+        Divides all values by their sum, or by the given total.
+        """
+        if total is None:
+            total = self.sum()
+
+        if self.table.dtype.kind != "f":
+            self.table = self.table.astype(float)
+
+        self.table /= float(total)
+
+
+class DenseConditionalTable(DenseTable):
+    """
+    Dense table of conditional values, that also keeps track of which values
+    of the conditional variables have data.
+
+    Attributes
+    ----------
+    conditional : {name: [value]}
+        The variables that are conditioned on.
+    conditional_table : DenseTable
+        True for every combination of conditional variables that has data.
+    """
+    def __init__(self, column_names, conditional, values=None, dtype=float):
+        super(DenseConditionalTable, self).__init__(column_names, values, dtype)
 
         self.conditional = conditional
 
-        self.conditional_table = SparseTable(conditional)
+        self.conditional_table = DenseTable(conditional, dtype=bool)
 
     def set_value(self, row, value):
-        super(SparseConditionalTable, self).set_value(row, value)
+        super(DenseConditionalTable, self).set_value(row, value)
 
-        # Add entry to the conditional table
-        self.conditional_table.set_value({k: v for k, v in row.iteritems() if k in self.conditional.keys()}, True)
+        self.conditional_table.set_value(row, True)
+
+    def add_values(self, rows, amounts=1):
+        super(DenseConditionalTable, self).add_values(rows, amounts)
+
+        for row in self._decode_rows(rows):
+            self.conditional_table.set_value(row, True)
+
+    def _add_table(self, other):
+        super(DenseConditionalTable, self)._add_table(other)
+
+        self.conditional_table.table |= other.conditional_table.table
+
+    def memory_report(self):
+        report = super(DenseConditionalTable, self).memory_report()
+        report["conditional_table"] = self.conditional_table.nbytes()
+
+        return report
 
     def has_data(self, conditional):
         return self.conditional_table.get_value(conditional)
 
 
+class CountMinTable(Table):
+    """
+    Approximate counts of all combinations in a Count-Min sketch, which
+    takes a fixed amount of memory however many combinations are counted.
+
+    Every combination is added to one counter in each of `depth` rows of
+    `width` counters, chosen by a pairwise independent hash of the row per
+    row, and its count is estimated as the minimum of its counters.
+    For a total count N, an estimate is never lower than the true count,
+    and with probability at least 1 - delta at most epsilon * N higher,
+    where width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)).
+
+    Values can only be added to, not set.
+
+    Attributes
+    ----------
+    order : [name]
+        Variables in sorted order.
+    indices : {name: {value: int}}
+        Encoding of every variable's values.
+    width : int
+    depth : int
+    seed : int
+        Seed of the hash functions; only sketches with the same seed can be merged.
+    hashes : [(int, int)]
+        Coefficients of the hash function of every row.
+    table : ndarray
+        The depth by width counters.
+    total : number
+        Sum of all added values.
+    """
+    # Mersenne prime 2^61 - 1, larger than any counter index
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, column_names, epsilon=0.001, delta=0.01, seed=0):
+        """
+        Parameters
+        ----------
+        column_names : {str: [str]}
+            See Table.
+        epsilon : float
+            Error of the estimates, as a fraction of the total count.
+        delta : float
+            Probability that an estimate has a larger error.
+        seed : int
+        """
+        super(CountMinTable, self).__init__(column_names)
+
+        self.order = list(self._column_names.keys())
+        self.order.sort()
+
+        self.indices = {name: {value: i for i, value in enumerate(self._column_names[name])}
+                        for name in self.order}
+
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1 / delta)))
+        self.seed = seed
+
+        generator = random.Random(seed)
+        self.hashes = [(generator.randint(1, self.PRIME - 1), generator.randint(0, self.PRIME - 1))
+                       for _ in range(self.depth)]
+
+        self.table = np.zeros((self.depth, self.width))
+        self.total = 0
+
+    def get_variables(self):
+        return self._column_names.copy()
+
+    def get_error_bound(self):
+        """
+        Returns
+        -------
+        float
+            Amount by which an estimate exceeds the true value at most, with
+            probability at least 1 - exp(-depth).
+        """
+        return math.e / self.width * self.total
+
+    def __columns(self, row):
+        """
+        Returns
+        -------
+        [int]
+            Counter of the row in every row of the sketch.
+        """
+        x = 0
+        try:
+            for name in self.order:
+                x = x * len(self._column_names[name]) + self.indices[name][row[name]]
+        except KeyError:
+            raise IndexError("Row {0} does not have a valid value of every variable in this Table".format(row))
+
+        x %= self.PRIME
+        return [((a * x + b) % self.PRIME) % self.width for a, b in self.hashes]
+
+    def get_value(self, row):
+        table = self.table
+        return min(table[i, j] for i, j in enumerate(self.__columns(row)))
+
+    def set_value(self, row, value):
+        raise RuntimeError("Values of a sketch can only be added to.")
+
+    def add_value(self, row, amount):
+        self.table[np.arange(self.depth), self.__columns(row)] += amount
+        self.total += amount
+
+    def inc_value(self, vals):
+        self.add_value(vals, 1)
+
+    def add_values(self, rows, amounts=1):
+        rows = self._decode_rows(rows)
+        for row, amount in zip(rows, np.broadcast_to(amounts, (len(rows),))):
+            self.add_value(row, amount)
+
+    def do_operation(self, f):
+        """
+        Perform function f(x) on every counter and the total.
+
+        Parameters
+        ----------
+        f : function x: f(x)
+            Should be a scaling x: c * x, for the estimates to keep their bounds.
+        """
+        self.table = np.asarray(f(self.table))
+        self.total = f(self.total)
+
+    def _add_table(self, other):
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise RuntimeError("Can only merge sketches of the same size and seed.")
+
+        self.table = self.table + other.table
+        self.total += other.total
+
+    def memory_report(self):
+        return {"table": self.table.nbytes}
+
+
+class CountMinConditionalTable(CountMinTable):
+    """
+    Approximate conditional probabilities, as the ratio of the sketched
+    counts of all variables to those of only the conditional variables.
+
+    Both counts are overestimated by at most their error bound, so the
+    ratio is only accurate for combinations with counts well above it.
+
+    Attributes
+    ----------
+    conditional : {name: [value]}
+        The variables that are conditioned on.
+    conditional_table : CountMinTable
+        Counts of the combinations of the conditional variables.
+    """
+    def __init__(self, column_names, conditional, epsilon=0.001, delta=0.01, seed=0):
+        super(CountMinConditionalTable, self).__init__(column_names, epsilon, delta, seed)
+
+        self.conditional = conditional
+
+        self.conditional_table = CountMinTable(conditional, epsilon, delta, seed)
+
+    def add_value(self, row, amount):
+        super(CountMinConditionalTable, self).add_value(row, amount)
+
+        self.conditional_table.add_value(row, amount)
+
+    def get_value(self, row):
+        """
+        Returns
+        -------
+        float
+            Estimate of the probability of the row given its conditional variables.
+        """
+        total = self.conditional_table.get_value(row)
+        if total == 0:
+            return 0
+
+        return min(1.0, super(CountMinConditionalTable, self).get_value(row) / float(total))
+
+    def do_operation(self, f):
+        raise RuntimeError("Values are computed from the counts.")
+
+    def _add_table(self, other):
+        super(CountMinConditionalTable, self)._add_table(other)
+
+        self.conditional_table._add_table(other.conditional_table)
+
+    def memory_report(self):
+        report = super(CountMinConditionalTable, self).memory_report()
+        report["conditional_table"] = self.conditional_table.nbytes()
+
+        return report
+
+    def has_data(self, conditional):
+        return self.conditional_table.get_value(conditional) > 0
+
+
 class Distribution(SparseTable):
+    # Tolerances within which two distributions are equal
+    RTOL = 1e-9
+    ATOL = 1e-12
+
     def __init__(self, column_names, freq=None):
         """
         Parameters
@@ -313,15 +1047,29 @@ class Distribution(SparseTable):
         ----------
         variables : {name: [value]}
             Variables and for each a list of their possible values.
+        marginals : {(name): {(value): number}}
+            For every sorted subset of variables that was asked for in
+            `partial_prob`, the sum of the probabilities of every combination
+            of their values.
+        samplers : {((name), (value)): ([(value)], ndarray, ndarray, ndarray)}
+            For every evidence that was sampled with, the keys and value
+            indices of the combinations that agree with it and their alias
+            table; cleared
+            whenever a probability changes.
         """
+        self.marginals = {}
+        self.samplers = {}
+
         if freq is None:
             super(Distribution, self).__init__(column_names)
         elif isinstance(freq, SparseTable):
             self._column_names = deepcopy(freq._column_names)
             self.order = deepcopy(freq.order)
             self.last = deepcopy(freq.last)
+            self.columns = self.order + [self.last]
 
-            self.table = deepcopy(freq.table)
+            # Keys are tuples and values numbers, so a shallow copy does not share anything mutable
+            self.table = dict(freq.table)
         else:
             raise RuntimeError("Not a Table.")
 
@@ -329,34 +1077,128 @@ class Distribution(SparseTable):
         if not isinstance(other, Distribution):
             return False
 
-        # Check if variables and values are the same
-        for variable in self._column_names:
-            if variable not in other._column_names:
-                return False
-            else:
-                a = self._column_names[variable]
-                b = self._column_names[variable]
+        return self.is_close(other)
 
-                if not set(a) == set(b):
-                    return False
+    def __ne__(self, other):
+        return not self == other
 
-        # Check if all values are the same
-        values = []
-        for variable in self.order:
-            values.append(self._column_names[variable])
-        values.append(self._column_names[self.last])
+    def is_close(self, other, rtol=RTOL, atol=ATOL):
+        """
+        Parameters
+        ----------
+        other : Distribution
+        rtol : float
+            Relative tolerance, as a fraction of the other's probability.
+        atol : float
+            Absolute tolerance.
+
+        Returns
+        -------
+        bool
+            True if both have the same variables and values, and the
+            probabilities of all combinations are within the tolerance.
+        """
+        if not self.__has_same_variables(other):
+            return False
+
+        a, b = self.__aligned_values(other)[1:]
 
-        for combination in list(itertools.product(*values)):
-            vals = {}
-            for i in range(len(self.order)):
-                vals[self.order[i]] = combination[i]
-            vals[self.last] = combination[-1]
+        return bool(np.all(np.abs(a - b) <= atol + rtol * np.abs(b)))
 
-            if self.get_value(vals) != other.get_value(vals):
+    def diff(self, other, n=10):
+        """
+        Parameters
+        ----------
+        other : Distribution
+        n : int
+            Number of deviations to report.
+
+        Returns
+        -------
+        [({name: value}, number, number)]
+            The n combinations of which the probabilities differ the most,
+            with this and the other's probability, largest difference first.
+        """
+        if not self.__has_same_variables(other):
+            raise RuntimeError("Can only compare distributions with the same variables and values.")
+
+        keys, a, b = self.__aligned_values(other)
+
+        deviations = np.abs(a - b)
+        largest = np.argsort(-deviations, kind="mergesort")[:n]
+
+        return [(dict(zip(self.columns, keys[i])), a[i], b[i]) for i in largest if deviations[i] > 0]
+
+    def __has_same_variables(self, other):
+        if set(self._column_names.keys()) != set(other._column_names.keys()):
+            return False
+
+        for variable in self._column_names:
+            if set(self._column_names[variable]) != set(other._column_names[variable]):
                 return False
 
         return True
 
+    def __aligned_values(self, other):
+        """
+        Returns
+        -------
+        [(value)]
+            Keys of all combinations that are stored in either distribution.
+        ndarray
+            Probability of every combination in this distribution.
+        ndarray
+            Probability of every combination in the other distribution.
+        """
+        keys = sorted(set(self.table) | set(other.table))
+
+        a = np.array([self.table.get(key, 0) for key in keys], dtype=float)
+        b = np.array([other.table.get(key, 0) for key in keys], dtype=float)
+
+        return keys, a, b
+
+    def set_value(self, row, value):
+        key = self.key(row)
+        difference = value - self.table.get(key, 0)
+
+        self.table[key] = value
+        self.samplers = {}
+
+        # Keep the marginals up to date instead of calculating them again
+        for names, marginal in self.marginals.iteritems():
+            partial = tuple(row[name] for name in names)
+            marginal[partial] = marginal.get(partial, 0) + difference
+
+    def inc_value(self, vals):
+        self.set_value(vals, self.get_value(vals) + 1)
+
+    def do_operation(self, f):
+        super(Distribution, self).do_operation(f)
+
+        self.marginals = {}
+        self.samplers = {}
+
+    def add_values(self, rows, amounts=1):
+        super(Distribution, self).add_values(rows, amounts)
+
+        self.marginals = {}
+        self.samplers = {}
+
+    def _add_table(self, other):
+        super(Distribution, self)._add_table(other)
+
+        self.marginals = {}
+        self.samplers = {}
+
+    def memory_report(self):
+        report = super(Distribution, self).memory_report()
+        report["marginals"] = _container_nbytes(self.marginals)
+        report["samplers"] = sum(sys.getsizeof(keys) + sum(sys.getsizeof(key) for key in keys) +
+                                 codes.nbytes + prob.nbytes + alias.nbytes
+                                 for keys, codes, prob, alias in self.samplers.itervalues())
+
+        return report
+
     def set_prob(self, vals, p):
         """
 
@@ -393,48 +1235,117 @@ class Distribution(SparseTable):
         """
         return self.partial_prob({variable: value})
 
+    def sample(self, n, evidence=None, encoded=False):
+        """
+        Draws combinations in proportion to their probability, with an alias
+        table, so that every sample takes constant time.
+
+        The alias table for the evidence is built once, and used until a
+        probability changes.
+        Samples are drawn with a NumPy generator seeded from `random`, so
+        seeding `random` makes them reproducible.
+
+        Parameters
+        ----------
+        n : int
+            Number of samples.
+        evidence : {name: value}, optional
+            Values of some variables; only combinations that agree are drawn.
+        encoded : bool
+            True to return value indices instead of values.
+
+        Returns
+        -------
+        [{name: value}] or ndarray
+            The samples, or, when encoded, an integer array with one row of
+            value indices per sample, with the variables in sorted order.
+        """
+        if evidence is None:
+            evidence = {}
+
+        names = tuple(sorted(evidence))
+        key = (names, tuple(evidence[name] for name in names))
+
+        if key not in self.samplers:
+            self.samplers[key] = self.__make_sampler(evidence)
+        keys, codes, prob, alias = self.samplers[key]
+
+        generator = np.random.RandomState(random.getrandbits(32))
+        i = generator.randint(len(keys), size=n)
+        i = np.where(generator.random_sample(n) < prob[i], i, alias[i])
+
+        if encoded:
+            return codes[i]
+
+        return [dict(zip(self.columns, keys[j])) for j in i]
+
+    def __make_sampler(self, evidence):
+        """
+        Builds the alias table of the combinations that agree with the evidence.
+
+        Returns
+        -------
+        [(value)]
+            Keys of the combinations with a positive probability.
+        ndarray
+            Value indices of every key.
+        ndarray
+            Probability of drawing every combination when its index is drawn.
+        ndarray
+            Index to draw instead otherwise.
+        """
+        indices = [(self.columns.index(name), value) for name, value in evidence.iteritems()]
+
+        keys = sorted(k for k, value in self.table.iteritems()
+                      if value > 0 and all(k[i] == v for i, v in indices))
+        if len(keys) == 0:
+            raise RuntimeError("No combination that agrees with the evidence has a probability.")
+
+        weights = np.array([self.table[k] for k in keys], dtype=float)
+        scaled = weights * len(keys) / weights.sum()
+
+        prob = np.ones(len(keys))
+        alias = np.arange(len(keys))
+
+        small = [i for i in range(len(keys)) if scaled[i] < 1]
+        large = [i for i in range(len(keys)) if scaled[i] >= 1]
+
+        # Fill every index below one with the excess of one above one
+        while len(small) > 0 and len(large) > 0:
+            s = small.pop()
+            l = large.pop()
+
+            prob[s] = scaled[s]
+            alias[s] = l
+
+            scaled[l] -= 1 - scaled[s]
+            if scaled[l] < 1:
+                small.append(l)
+            else:
+                large.append(l)
+
+        codes = np.array([[self._column_names[name].index(value) for name, value in zip(self.columns, k)]
+                          for k in keys], dtype=np.intp).reshape(-1, len(self.columns))
+
+        return keys, codes, prob, alias
+
     def partial_prob(self, vals):
         # Check if all variables are here
         for variable in vals:
             if variable not in self.order and variable != self.last:
                 raise IndexError("Variable {0} is not in this distribution.".format(variable))
 
-        return self.__partial_prob_rec(vals, self.table, self.order)
+        names = tuple(sorted(vals))
 
-    def __partial_prob_rec(self, vals, current, order):
-        """
-        Calculates the probability of a set of variable=value pairs.
-
-        By summing all branches of other variables and then only taking the
-        probabilities of the branches that go through the variable=value branch.
+        if names not in self.marginals:
+            # Sum the probabilities of all combinations with the same values for the variables, once
+            indices = [self.columns.index(name) for name in names]
 
-        """
-        p = 0
+            marginal = {}
+            for key, value in self.table.iteritems():
+                partial = tuple(key[i] for i in indices)
+                marginal[partial] = marginal.get(partial, 0) + value
 
-        if len(order) > 0:
-            # If we found the variable
-            if order[0] in vals:
-                # Take only the branch with the specified value for that variable
-                if vals[order[0]] in current:
-                    p += self.__partial_prob_rec(vals, current[vals[order[0]]], order[1:])
-                else:
-                    return 0.0
-            # If the variable is one we do not have a particular value for
-            else:
-                # Sum the probabilities of all possible values for that variable
-                for branch in current:
-                    p += self.__partial_prob_rec(vals, current[branch], order[1:])
-        # When we're at the end (with the values)
-        else:
-            # If this is the variable
-            if self.last in vals:
-                # Only take the number for the value that the variable was set to
-                if vals[self.last] in current:
-                    p += current[vals[self.last]]
-            # If its a different variable
-            else:
-                # Sum over all the values
-                for value in current:
-                    p += current[value]
+            self.marginals[names] = marginal
 
-        return p
+        return self.marginals[names].get(tuple(vals[name] for name in names), 0)
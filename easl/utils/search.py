@@ -0,0 +1,136 @@
+__author__ = 'Dennis'
+
+
+def branch_and_bound(variables, score, bound=None, rtol=0.0):
+    """
+    Finds all combinations of values of the variables with the maximum score.
+
+    Variables are assigned one at a time; a partial assignment is not
+    extended when the upper bound of the scores of all its completions is
+    lower than the best score found so far, so the result is the same as
+    when all combinations are scored.
+
+    Parameters
+    ----------
+    variables : [(string, [string])]
+        Names and domains, in the order to assign them.
+    score : function
+        Takes a complete assignment {string: string} and returns its score.
+    bound : function, optional
+        Takes a partial assignment {string: string} and returns an upper
+        bound of the scores of all its completions; None to never prune.
+    rtol : float
+        Scores within this relative tolerance of the maximum are ties.
+
+    Returns
+    -------
+    float
+        The maximum score, or None if there are no combinations.
+    [{string: string}]
+        All combinations with the maximum score, in the order of
+        `itertools.product` over the domains.
+    """
+    best = [None]
+    found = []
+
+    def search(assignment, i):
+        if bound is not None and best[0] is not None and i < len(variables):
+            if bound(assignment) < best[0] - rtol * abs(best[0]):
+                return
+
+        if i == len(variables):
+            value = score(dict(assignment))
+            found.append((value, dict(assignment)))
+            if best[0] is None or value > best[0]:
+                best[0] = value
+            return
+
+        name, domain = variables[i]
+        for value in domain:
+            assignment[name] = value
+            search(assignment, i + 1)
+        del assignment[name]
+
+    if len(variables) == 0:
+        value = score({})
+        return value, [{}]
+
+    search({}, 0)
+
+    if best[0] is None:
+        return None, []
+
+    # Combinations that were scored before the maximum was found may not be ties
+    threshold = best[0] - rtol * abs(best[0])
+    return best[0], [combination for value, combination in found if value >= threshold]
+
+
+class SumTree(object):
+    """
+    Non-negative weights of which the total up to any index is kept, so that
+    a single weight can be changed, and an index sampled in proportion to
+    the weights, in logarithmic time.
+
+    Attributes
+    ----------
+    n : int
+        Number of weights.
+    weights : [float]
+    tree : [float]
+        Partial sums of the weights, as a binary indexed tree.
+    """
+    def __init__(self, weights):
+        self.n = len(weights)
+        self.weights = [0.0] * self.n
+        self.tree = [0.0] * (self.n + 1)
+
+        for i, weight in enumerate(weights):
+            self.set_weight(i, weight)
+
+    def set_weight(self, i, weight):
+        difference = weight - self.weights[i]
+        self.weights[i] = weight
+
+        j = i + 1
+        while j <= self.n:
+            self.tree[j] += difference
+            j += j & -j
+
+    def get_weight(self, i):
+        return self.weights[i]
+
+    def total(self):
+        return self.cumulative(self.n - 1)
+
+    def cumulative(self, i):
+        """
+        Sum of the weights up to and including index i.
+        """
+        total = 0.0
+        j = i + 1
+        while j > 0:
+            total += self.tree[j]
+            j -= j & -j
+
+        return total
+
+    def find(self, r):
+        """
+        Returns
+        -------
+        int
+            The first index at which the cumulative weight is at least r.
+        """
+        i = 0
+        step = 1
+        while step * 2 <= self.n:
+            step *= 2
+
+        remaining = r
+        while step > 0:
+            if i + step <= self.n and self.tree[i + step] < remaining:
+                i += step
+                remaining -= self.tree[i]
+            step //= 2
+
+        return min(i, self.n - 1)
@@ -0,0 +1,230 @@
+__author__ = 'Dennis'
+
+import itertools
+import json
+import zipfile
+
+import numpy as np
+
+from probability import FullTable
+from probability import FlatFullTable
+from probability import SparseTable
+from probability import SparseConditionalTable
+from probability import DenseTable
+from probability import DenseConditionalTable
+from probability import Distribution
+
+
+TABLE_TYPES = {cls.__name__: cls for cls in [FullTable, FlatFullTable, SparseTable, SparseConditionalTable,
+                                             DenseTable, DenseConditionalTable, Distribution]}
+
+
+def save_table(table, file_name):
+    """
+    Writes a table to an uncompressed .npz archive.
+
+    The archive holds the schema, i.e. the type of the table and the values
+    of every variable, and the values of the table as flat arrays:
+    the values of all combinations in mixed-radix order over the sorted
+    variables for full tables, or the value indices and the values of the
+    stored combinations for sparse tables.
+
+    Parameters
+    ----------
+    table : Table
+    file_name : string
+        Name of the file to write to; '.npz' is appended unless it ends with it,
+        as `numpy.savez` does.
+    """
+    file_name = _archive_name(file_name)
+
+    name = type(table).__name__
+    if name not in TABLE_TYPES:
+        raise RuntimeError("Can not save a table of type {0}.".format(name))
+
+    variables = table._column_names
+    schema = {"type": name,
+              "variables": _encode_variables(variables)}
+    arrays = {}
+
+    if isinstance(table, DenseTable):
+        arrays["values"] = np.ravel(table.table)
+    elif isinstance(table, FullTable):
+        arrays["values"] = np.array([table.get_value(row) for row in _all_rows(variables)])
+    else:
+        arrays["codes"], arrays["values"] = _encode_entries(table.table, table.columns, variables)
+
+    if isinstance(table, (DenseConditionalTable, SparseConditionalTable)):
+        schema["conditional"] = _encode_variables(table.conditional)
+
+        if isinstance(table, DenseConditionalTable):
+            arrays["conditional"] = np.ravel(table.conditional_table.table)
+        else:
+            arrays["conditional"], _ = _encode_entries(dict.fromkeys(table.conditioning, True),
+                                                       table.conditional_order, table.conditional)
+
+    np.savez(file_name, schema=np.array(json.dumps(schema)), **arrays)
+
+
+def load_table(file_name, mmap_mode=None):
+    """
+    Reads a table that was written by `save_table`.
+
+    Parameters
+    ----------
+    file_name : string
+        Name the table was saved with; '.npz' is appended unless it ends with it.
+    mmap_mode : string, optional
+        When given, the values are memory-mapped from the file with this
+        mode ('r', 'r+' or 'c', see `numpy.memmap`) instead of read, so that
+        a large table is opened without reading it, and can be shared
+        read-only by several processes.
+        Only full tables are stored as an array; a sparse table is always
+        read into a dict.
+
+    Returns
+    -------
+    Table
+    """
+    file_name = _archive_name(file_name)
+
+    archive = np.load(file_name)
+    try:
+        schema = json.loads(str(archive["schema"]))
+
+        variables = _decode_variables(schema["variables"])
+        name = schema["type"]
+        if name not in TABLE_TYPES:
+            raise RuntimeError("Unknown table type {0}.".format(name))
+
+        if mmap_mode is not None and name in ["DenseTable", "DenseConditionalTable", "FlatFullTable"]:
+            values = _memmap_member(file_name, "values", mmap_mode)
+        else:
+            values = archive["values"]
+
+        if name in ["DenseTable", "DenseConditionalTable", "FlatFullTable"]:
+            shape = tuple(len(variables[v]) for v in sorted(variables.keys()))
+
+            if name != "DenseConditionalTable":
+                return TABLE_TYPES[name](variables, values.reshape(shape))
+
+            conditional = _decode_variables(schema["conditional"])
+            table = DenseConditionalTable(variables, conditional, values.reshape(shape))
+            table.conditional_table.table = archive["conditional"].reshape(table.conditional_table.shape)
+            return table
+        elif name == "FullTable":
+            table = FullTable(variables)
+            for row, value in itertools.izip(_all_rows(variables), values.tolist()):
+                table.set_value(row, value)
+            return table
+
+        if name == "SparseConditionalTable":
+            conditional = _decode_variables(schema["conditional"])
+            table = SparseConditionalTable(variables, conditional)
+            table.conditioning = set(_decode_entries(archive["conditional"], None, table.conditional_order,
+                                                     conditional))
+        else:
+            table = TABLE_TYPES[name](variables)
+
+        table.table = _decode_entries(archive["codes"], values, table.columns, variables)
+        return table
+    finally:
+        archive.close()
+
+
+def _archive_name(file_name):
+    if not file_name.endswith(".npz"):
+        return file_name + ".npz"
+
+    return file_name
+
+
+def _encode_variables(variables):
+    return [[name, variables[name]] for name in sorted(variables.keys())]
+
+
+def _decode_variables(encoded):
+    return {_restore(name): [_restore(value) for value in values] for name, values in encoded}
+
+
+def _restore(value):
+    """
+    JSON reads all strings as unicode; restores them to the str they were.
+    """
+    if isinstance(value, unicode):
+        try:
+            return str(value)
+        except UnicodeEncodeError:
+            return value
+
+    return value
+
+
+def _all_rows(variables):
+    order = sorted(variables.keys())
+    for combination in itertools.product(*[variables[name] for name in order]):
+        yield dict(zip(order, combination))
+
+
+def _encode_entries(table, columns, variables):
+    """
+    Returns
+    -------
+    ndarray
+        Value indices of every key, with one column per variable.
+    ndarray
+        Value of every key.
+    """
+    indices = [{value: i for i, value in enumerate(variables[name])} for name in columns]
+
+    keys = list(table.keys())
+    codes = np.array([[index[value] for index, value in zip(indices, key)] for key in keys],
+                     dtype=np.int32).reshape(-1, len(columns))
+
+    return codes, np.array([table[key] for key in keys])
+
+
+def _decode_entries(codes, values, columns, variables):
+    """
+    Parameters
+    ----------
+    values : ndarray
+        Value of every key, or None to set all to True.
+    """
+    domains = [variables[name] for name in columns]
+    keys = [tuple(domain[i] for domain, i in zip(domains, row)) for row in codes.tolist()]
+
+    if values is None:
+        return dict.fromkeys(keys, True)
+
+    return dict(zip(keys, values.tolist()))
+
+
+def _memmap_member(file_name, member, mmap_mode):
+    """
+    Memory-maps an array in an uncompressed .npz archive.
+
+    The members of an archive written by `numpy.savez` are stored as is,
+    so the array starts at a fixed offset in the file.
+    """
+    with zipfile.ZipFile(file_name) as archive:
+        info = archive.getinfo(member + ".npy")
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise RuntimeError("Can only memory-map arrays of uncompressed archives.")
+
+    with open(file_name, "rb") as f:
+        # Skip the local file header, of which the name and extra field lengths are at 26
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    return np.memmap(file_name, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape,
+                     order="F" if fortran_order else "C")
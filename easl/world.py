@@ -1,5 +1,7 @@
 __author__ = 'Dennis'
 
+from collections import OrderedDict
+
 from log import Log
 from visualize import *
 
@@ -12,10 +14,14 @@ class Sensor(object):
         observations
             Reference to the observations list of the Entity with this Sensor.
         signals : {name: [value]}
+        modalities : set(string)
+            Modalities of the signals that this Sensor detects, unless
+            `detects_modality` is overridden.
         """
         self.observations = None
         self.signals = {}
         self.default_signals = {}
+        self.modalities = set()
 
         self.init()
 
@@ -35,7 +41,7 @@ class Sensor(object):
         self.observations = observations
 
     def detects_modality(self, modality):
-        return False
+        return modality in self.modalities
 
 
 class Signal(object):
@@ -82,17 +88,23 @@ class World(object):
     ----------
     entities : {name: Entity}
         all entities in the world identified by name
-    triggers : [(string, string, string, string)]
+    triggers : {(string, string, string): OrderedDict}
         The connections between entities that link actions and triggers.
-        Causing entity name, attribute name, event name, affected entity name.
+        For every causing entity name, attribute name and event name, the
+        names of the affected entities, in the order they were added.
     log : Log
     time : int
     signals : [(string, Signal)]
         All queued signals with the names of the entities that will receive them.
+    routes : {string: [string]}
+        For every modality that was sent, the names of the entities with a
+        sensor that detects it; cleared when an entity or sensor is added.
     """
     def __init__(self, visualizer=None):
         self.entities = {}
-        self.triggers = []
+        self.triggers = OrderedDict()
+
+        self.routes = {}
 
         self.log = None
 
@@ -152,7 +164,7 @@ class World(object):
             if self.visualizer is not None:
                 self.visualizer.reset_visualization()
                 self.visualizer.update_visualization(Number("time", self.time))
-                self.visualizer.update_visualization(List("triggers", self.triggers))
+                self.visualizer.update_visualization(List("triggers", self.get_triggers()))
 
                 entity_group = Group("entities")
                 agent_group = Group("agents")
@@ -170,12 +182,39 @@ class World(object):
     def add_entity(self, entity):
         self.entities[entity.name] = entity
 
+        self.routes = {}
+        entity.add_sensor_listener(self.__sensor_added)
+
+    def __sensor_added(self, entity, sensor):
+        self.routes = {}
+
+    def get_receivers(self, modality):
+        """
+        Returns
+        -------
+        [string]
+            Names of the entities with a sensor that detects the modality.
+        """
+        if modality not in self.routes:
+            self.routes[modality] = [name for name in self.entities
+                                     if any(sensor.detects_modality(modality)
+                                            for sensor in self.entities[name].sensors)]
+
+        return self.routes[modality]
+
     def has_trigger(self, causing, attribute, event, affected):
-        for i in range(len(self.triggers)):
-            c, att, e, aff = self.triggers[i]
-            if c == causing and att == attribute and e == event and aff == affected:
-                return i
-        return None
+        return affected in self.triggers.get((causing, attribute, event), ())
+
+    def get_triggers(self):
+        """
+        Returns
+        -------
+        [(string, string, string, string)]
+            Causing entity name, attribute name, event name and affected
+            entity name of every trigger.
+        """
+        return [cause + (affected,) for cause, affected_entities in self.triggers.iteritems()
+                for affected in affected_entities]
 
     def add_trigger(self, causing, attribute, event, affected):
         """
@@ -191,13 +230,15 @@ class World(object):
         affected : string
             Name of the Entity that is affected by the event.
         """
-        if self.has_trigger(causing, attribute, event, affected) is None:
-            self.triggers.append((causing, attribute, event, affected))
+        self.triggers.setdefault((causing, attribute, event), OrderedDict())[affected] = True
 
     def remove_trigger(self, causing, attribute, event, affected):
-        i = self.has_trigger(causing, attribute, event, affected)
-        if i is not None:
-            del self.triggers[i]
+        cause = (causing, attribute, event)
+        if affected in self.triggers.get(cause, ()):
+            del self.triggers[cause][affected]
+
+            if len(self.triggers[cause]) == 0:
+                del self.triggers[cause]
 
     def __do_physics(self):
         """
@@ -216,20 +257,18 @@ class World(object):
             self.entities[sender].emit_signals()
 
             for signal in self.entities[sender].get_queued_signals():
-                for receiver in self.entities:
-                    for sensor in self.entities[receiver].sensors:
-                        if sensor.detects_modality(signal.modality):
-                            self.queued_signals.append((receiver, signal))
+                for receiver in self.get_receivers(signal.modality):
+                    self.queued_signals.append((receiver, signal))
 
     def __send_signals(self):
         """
         Add the queued signals as observations to the appropriate entities.
         """
-        while len(self.queued_signals) > 0:
-            receiver, signal = self.queued_signals.pop(0)
-
+        for receiver, signal in self.queued_signals:
             self.entities[receiver].add_observation({signal.sig_type: signal.value})
 
+        self.queued_signals = []
+
     def __queue_motor_signals(self):
         """
         Makes all Entities prepare their motor signals.
@@ -254,9 +293,8 @@ class World(object):
                 attribute, event, params = self.entities[cause].event_queue.pop(0)
 
                 # Find all entities that are triggered by this event
-                for (causer, causer_attribute, caused_event, affected) in self.triggers:
-                    if causer == cause and causer_attribute == attribute and caused_event == event:
-                        self.entities[affected].call_trigger(event, params)
+                for affected in self.triggers.get((cause, attribute, event), {}).keys():
+                    self.entities[affected].call_trigger(event, params)
 
     def __measure_entities(self):
         """
@@ -143,7 +143,7 @@ def infant_new_causal_controller():
     controller = CausalLearningMechanism()
     controller.set_rewards({"movement": "faster"})
     controller.add_ignored(["movement"])
-    controller.set_motor_signal_bias(infant_action_valuation_constant, 0.5)
+    controller.set_motor_signal_bias(infant_action_valuation_constant, 0.5, infant_action_valuation_constant)
     controller.set_considered_signals(["left-foot", "right-foot", "left-hand", "right-hand"])
     controller.set_considered_sensory(["left-foot-position", "right-foot-position", "left-hand-position", "right-hand-position"])
 
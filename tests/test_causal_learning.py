@@ -0,0 +1,188 @@
+__author__ = 'Dennis'
+
+import imp
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+from easl import World
+from easl.mechanisms.causal_learning import CausalLearningMechanism
+from easl.mechanisms.causal_learning import FrequencyCounter
+
+
+class FrequencyCounterTest(unittest.TestCase):
+    def test_decay_with_narrow_counts(self):
+        variables = {"e": ["x", "y"], "c": ["0", "1"]}
+        counter = FrequencyCounter(variables, [], ["c"], evidence=["e"], decay=0.5, dtype=np.uint16)
+
+        # The block of x only gets the first entry, at weight 1, so it keeps its type until all are scaled
+        counter.add_entry({"e": "x", "c": "0"})
+        for i in range(300):
+            counter.add_entry({"e": "y", "c": str(i % 2)})
+
+        self.assertGreater(counter.scales, 0)
+        self.assertEqual(counter.blocks[("x",)].table.dtype.kind, "f")
+        self.assertAlmostEqual(counter.get_conditional().get_value({"e": "x", "c": "0"}), 1.0)
+        self.assertAlmostEqual(counter.get_conditional().get_value({"e": "y", "c": "1"}), 2 / 3.0)
+
+    def test_window_keeps_only_counted_entries(self):
+        variables = {"e": [str(i) for i in range(10)], "c": [str(i) for i in range(10)]}
+
+        for sparse in [True, False]:
+            counter = FrequencyCounter(variables, [], ["c"], evidence=["e"], window=5, sparse=sparse)
+            for i in range(100):
+                counter.add_entry({"e": str(i % 10), "c": str(i // 10)})
+
+            # The last five entries all have different evidence and combinations
+            self.assertEqual(len(counter.freq.table), 5)
+            self.assertEqual(len(counter.totals.table), 5)
+            self.assertEqual(sorted(counter.blocks.keys()), [(str(i),) for i in range(5, 10)])
+            self.assertEqual(sorted(counter.total_blocks.keys()), [(str(i),) for i in range(5, 10)])
+            self.assertAlmostEqual(counter.get_conditional().get_value({"e": "7", "c": "9"}), 1.0)
+            self.assertEqual(counter.get_conditional().get_value({"e": "2", "c": "9"}), 0)
+
+    def test_sketch_approximates_counts(self):
+        variables = {"e": [str(i) for i in range(10)], "c": [str(i) for i in range(10)]}
+        exact = FrequencyCounter(variables, [], ["c"], window=50)
+        sketched = FrequencyCounter(variables, [], ["c"], window=50, sketch=(0.01, 0.01))
+
+        rng = random.Random(0)
+        for i in range(200):
+            entry = {"e": str(rng.randint(0, 9)), "c": str(rng.randint(0, 3))}
+            exact.add_entry(entry)
+            sketched.add_entry(entry)
+
+        # Counts are only overestimated, by at most 1% of the entries in the window
+        bound = sketched.freq.get_error_bound()
+        self.assertLessEqual(bound, 0.5 + 1e-9)
+        for e, c in [(e, c) for e in variables["e"] for c in variables["c"]]:
+            row = {"e": e, "c": c}
+            self.assertGreaterEqual(sketched.freq.get_value(row), exact.freq.get_value(row))
+            self.assertLessEqual(sketched.freq.get_value(row), exact.freq.get_value(row) + bound)
+
+        self.assertEqual(sketched.get_conditional().has_data({"e": "3"}), exact.get_conditional().has_data({"e": "3"}))
+        self.assertRaises(RuntimeError, sketched.get_joint)
+        self.assertRaises(RuntimeError, FrequencyCounter, variables, [], ["c"], evidence=["e"], sketch=(0.01, 0.01))
+
+
+class SelectionModeTest(unittest.TestCase):
+    """
+    The faster selection modes should select what `__select_maximum` does,
+    also while P(limb|motor) and P(mobile|limb) have no data for many motor
+    signals and limb positions, and so use their defaults.
+    """
+    prefix = "_CausalLearningMechanism__"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.experiment = imp.load_source("mobile_world",
+                                         os.path.join(os.path.dirname(__file__), os.pardir, "mobile-world.py"))
+
+    def run_selections(self, mode, iterations=26):
+        """
+        Returns
+        -------
+        [((float, [{string: string}]), (float, [{string: string}]), tuple)]
+            For every selection, the result of the mode, the result of
+            `__select_maximum`, and the numbers of combinations of motor
+            signals and of limb positions with data, with the multiplicity.
+        """
+        random.seed(0)
+
+        controller = self.experiment.infant_new_causal_controller()
+        controller.set_selection_mode(mode)
+
+        # Explore briefly, so that many motor signals and limb positions are selected from without data
+        controller.exploration_iterations = 20
+
+        name = self.prefix + {CausalLearningMechanism.SELECTION_TENSOR: "select_maximum_tensor",
+                              CausalLearningMechanism.SELECTION_SPARSE: "select_maximum_sparse",
+                              CausalLearningMechanism.SELECTION_SAMPLING: "select_maximum_sampling"}[mode]
+        select = getattr(controller, name)
+        exact = getattr(controller, self.prefix + "select_maximum")
+        selections = []
+
+        def compare():
+            result = select()
+            selections.append((result, exact(), self.coverage(controller)))
+            return result
+
+        # The private selectors are looked up on the instance, so the mode's selector can be wrapped
+        setattr(controller, name, compare)
+
+        infant = self.experiment.create_infant()
+        infant.set_agent(controller)
+
+        world = World()
+        world.add_entity(infant)
+        world.add_entity(self.experiment.create_mobile_direction())
+        world.add_trigger("infant", "right-foot-position", "movement", "mobile")
+
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            world.run(iterations)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        return selections
+
+    def coverage(self, controller):
+        constant = getattr(controller, self.prefix + "get_constant")()
+        motor = [node for node in controller.node_values_cond_motor if node in controller.node_values_motor]
+        limb = controller.node_values_limb.keys()
+
+        with_motor = len([values for values in self.combinations(controller, motor)
+                          if controller.jpd2.has_data(dict(constant, **values))])
+        with_limb = len([values for values in self.combinations(controller, limb)
+                         if controller.jpd3.has_data(dict(constant, **values))])
+        # The reward is known, so each sum has a term for every value of it
+        multiplicity = getattr(controller, self.prefix + "get_multiplicity")(controller.counts2.free_order +
+                                                                             controller.counts3.free_order)
+
+        return with_motor, with_limb, multiplicity
+
+    @staticmethod
+    def combinations(controller, nodes):
+        return controller.all_possibilities({node: controller.node_values_all[node] for node in nodes})
+
+    @staticmethod
+    def key(combinations):
+        return sorted(tuple(sorted(combination.items())) for combination in combinations)
+
+    def assert_covered(self, selections):
+        self.assertGreater(len(selections), 0)
+        self.assertTrue(any(with_motor < 81 for _, _, (with_motor, _, _) in selections))
+        self.assertTrue(any(with_limb < 81 for _, _, (_, with_limb, _) in selections))
+        self.assertTrue(all(multiplicity > 1 for _, _, (_, _, multiplicity) in selections))
+
+    def assert_exact(self, mode):
+        selections = self.run_selections(mode)
+        self.assert_covered(selections)
+
+        for (valuation, combinations), (exact_valuation, exact_combinations), _ in selections:
+            self.assertAlmostEqual(valuation, exact_valuation, delta=1e-9 * exact_valuation)
+            self.assertEqual(self.key(combinations), self.key(exact_combinations))
+
+    def test_tensor(self):
+        self.assert_exact(CausalLearningMechanism.SELECTION_TENSOR)
+
+    def test_sparse(self):
+        self.assert_exact(CausalLearningMechanism.SELECTION_SPARSE)
+
+    def test_sampling(self):
+        selections = self.run_selections(CausalLearningMechanism.SELECTION_SAMPLING)
+        self.assert_covered(selections)
+
+        # The estimates may break ties differently, but should find maximizing combinations
+        for (valuation, combinations), (exact_valuation, exact_combinations), _ in selections:
+            exact = self.key(exact_combinations)
+            self.assertTrue(all(combination in exact for combination in self.key(combinations)))
+
+
+if __name__ == '__main__':
+    unittest.main()
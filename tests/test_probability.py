@@ -0,0 +1,156 @@
+__author__ = 'Dennis'
+
+import collections
+import random
+import unittest
+
+from easl.utils import CountMinTable
+from easl.utils import Distribution
+
+
+class CountMinTableTest(unittest.TestCase):
+    def test_estimates_within_bound(self):
+        variables = {"a": [str(i) for i in range(40)], "b": [str(i) for i in range(25)]}
+        table = CountMinTable(variables, epsilon=0.01, delta=0.01, seed=3)
+
+        # Skewed counts, so that many combinations share counters with frequent ones
+        generator = random.Random(0)
+        counts = collections.Counter()
+        for _ in range(20000):
+            row = (str(int(generator.paretovariate(1.0)) % 40), str(generator.randrange(25)))
+            counts[row] += 1
+            table.inc_value({"a": row[0], "b": row[1]})
+
+        self.assertEqual(table.total, 20000)
+
+        bound = table.get_error_bound()
+        for a in variables["a"]:
+            for b in variables["b"]:
+                estimate = table.get_value({"a": a, "b": b})
+                self.assertGreaterEqual(estimate, counts[(a, b)])
+                self.assertLessEqual(estimate, counts[(a, b)] + bound)
+
+    def test_merge(self):
+        variables = {"a": ["x", "y", "z"]}
+        first = CountMinTable(variables, epsilon=0.5, seed=1)
+        second = CountMinTable(variables, epsilon=0.5, seed=1)
+
+        first.add_value({"a": "x"}, 2)
+        second.add_value({"a": "x"}, 3)
+        second.add_value({"a": "y"}, 1)
+        merged = first.merge(second)
+
+        self.assertEqual(merged.total, 6)
+        self.assertGreaterEqual(merged.get_value({"a": "x"}), 5)
+        self.assertEqual(first.total, 2)
+        self.assertRaises(RuntimeError, first.merge, CountMinTable(variables, epsilon=0.5, seed=2))
+
+
+class DistributionTest(unittest.TestCase):
+    def setUp(self):
+        self.distribution = Distribution({"a": ["x", "y"], "b": ["1", "2", "3"]})
+        for a, b, p in [("x", "1", 0.05), ("x", "2", 0.15), ("x", "3", 0.3),
+                        ("y", "1", 0.4), ("y", "2", 0.1), ("y", "3", 0.0)]:
+            self.distribution.set_value({"a": a, "b": b}, p)
+
+    def frequencies(self, samples):
+        counts = collections.Counter((row["a"], row["b"]) for row in samples)
+        return {key: count / float(len(samples)) for key, count in counts.items()}
+
+    def test_sample(self):
+        random.seed(0)
+        frequencies = self.frequencies(self.distribution.sample(200000))
+
+        self.assertNotIn(("y", "3"), frequencies)
+        for (a, b), frequency in frequencies.items():
+            self.assertAlmostEqual(frequency, self.distribution.get_value({"a": a, "b": b}), delta=5e-3)
+
+    def test_sample_with_evidence(self):
+        random.seed(0)
+        frequencies = self.frequencies(self.distribution.sample(200000, {"a": "x"}))
+
+        self.assertEqual(set(frequencies), {("x", "1"), ("x", "2"), ("x", "3")})
+        for (a, b), frequency in frequencies.items():
+            self.assertAlmostEqual(frequency, self.distribution.get_value({"a": a, "b": b}) / 0.5, delta=5e-3)
+
+    def copy(self, changes=None, domain=None):
+        """
+        The distribution of `setUp`, with some probabilities changed, and
+        with a different order of the values of b.
+        """
+        copy = Distribution({"a": ["x", "y"], "b": ["1", "2", "3"] if domain is None else domain})
+        for key, p in self.distribution.table.items():
+            copy.set_value(dict(zip(self.distribution.columns, key)), p)
+
+        for (a, b), p in (changes or {}).items():
+            copy.set_value({"a": a, "b": b}, p)
+
+        return copy
+
+    def test_equal(self):
+        self.assertEqual(self.distribution, self.copy(domain=["3", "1", "2"]))
+        self.assertNotEqual(self.distribution, self.copy({("x", "1"): 0.06}))
+        self.assertNotEqual(self.distribution, Distribution({"a": ["x", "y"], "b": ["1", "2"]}))
+        self.assertNotEqual(self.distribution, Distribution({"a": ["x", "y"], "b": ["1", "2", "3"], "c": ["p"]}))
+        self.assertNotEqual(self.distribution, self.distribution.table)
+
+    def test_differs_only_in_the_others_combinations(self):
+        # Combinations that only the other has a probability for count as zero here
+        other = self.copy({("y", "3"): 0.1})
+        del self.distribution.table[("y", "3")]
+
+        self.assertNotEqual(self.distribution, other)
+        self.assertNotEqual(other, self.distribution)
+        self.assertEqual(self.distribution.diff(other), [({"a": "y", "b": "3"}, 0.0, 0.1)])
+
+    def test_stored_zero_equals_missing_combination(self):
+        other = self.copy()
+        del other.table[("y", "3")]
+
+        self.assertIn(("y", "3"), self.distribution.table)
+        self.assertEqual(self.distribution, other)
+        self.assertEqual(other, self.distribution)
+        self.assertEqual(self.distribution.diff(other), [])
+
+    def test_is_close_within_tolerance(self):
+        p = self.distribution.get_value({"a": "y", "b": "1"})
+        tolerance = Distribution.ATOL + Distribution.RTOL * p
+
+        inside = self.copy({("y", "1"): p + 0.5 * tolerance})
+        outside = self.copy({("y", "1"): p + 2 * tolerance})
+
+        self.assertTrue(self.distribution.is_close(inside))
+        self.assertEqual(self.distribution, inside)
+        self.assertFalse(self.distribution.is_close(outside))
+        self.assertNotEqual(self.distribution, outside)
+
+        # Near zero only the absolute tolerance applies
+        self.assertEqual(self.distribution.get_value({"a": "y", "b": "3"}), 0.0)
+        self.assertTrue(self.distribution.is_close(self.copy({("y", "3"): 0.5 * Distribution.ATOL})))
+        self.assertFalse(self.distribution.is_close(self.copy({("y", "3"): 2 * Distribution.ATOL})))
+        self.assertTrue(self.distribution.is_close(self.copy({("y", "3"): 1e-6}), atol=1e-5))
+
+    def test_diff_order(self):
+        other = self.copy({("x", "1"): 0.1, ("x", "3"): 0.1, ("y", "2"): 0.2, ("y", "3"): 0.1})
+        self.assertEqual(0.2 - 0.1, 0.1 - 0.0)
+
+        differences = self.distribution.diff(other)
+
+        # Largest difference first, equal differences in the order of the combinations
+        self.assertEqual([(row["a"], row["b"]) for row, _, _ in differences],
+                         [("x", "3"), ("y", "2"), ("y", "3"), ("x", "1")])
+        self.assertEqual([(a, b) for _, a, b in differences], [(0.3, 0.1), (0.1, 0.2), (0.0, 0.1), (0.05, 0.1)])
+        self.assertEqual(len(self.distribution.diff(other, n=2)), 2)
+        self.assertRaises(RuntimeError, self.distribution.diff, Distribution({"a": ["x", "y"]}))
+
+    def test_sample_is_reproducible(self):
+        random.seed(1)
+        first = self.distribution.sample(50, encoded=True)
+        random.seed(1)
+        second = self.distribution.sample(50, encoded=True)
+
+        self.assertEqual(first.tolist(), second.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
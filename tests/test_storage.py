@@ -0,0 +1,88 @@
+__author__ = 'Dennis'
+
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from easl.utils import FullTable
+from easl.utils import FlatFullTable
+from easl.utils import SparseTable
+from easl.utils import SparseConditionalTable
+from easl.utils import DenseTable
+from easl.utils import DenseConditionalTable
+from easl.utils import Distribution
+from easl.utils import save_table
+from easl.utils import load_table
+
+
+class StorageTest(unittest.TestCase):
+    variables = {"a": ["x", "y"], "b": ["1", "2", "3"], "c": ["p", "q"]}
+    conditional = {"a": ["x", "y"]}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        order = sorted(self.variables.keys())
+        self.rows = [dict(zip(order, combination))
+                     for combination in itertools.product(*[self.variables[name] for name in order])]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_tables(self):
+        tables = [FullTable(self.variables), FlatFullTable(self.variables), SparseTable(self.variables),
+                  SparseConditionalTable(self.variables, self.conditional), DenseTable(self.variables),
+                  DenseConditionalTable(self.variables, self.conditional), Distribution(self.variables)]
+
+        # Leave some combinations unset, and so some conditional values without data
+        for table in tables:
+            for i, row in enumerate(self.rows):
+                if row["a"] == "x" and i % 3 != 0:
+                    table.set_value(row, i / 4.0)
+
+        return tables
+
+    def assert_same(self, table, loaded):
+        self.assertIs(type(loaded), type(table))
+        self.assertEqual(loaded._column_names, self.variables)
+
+        for row in self.rows:
+            self.assertEqual(loaded.get_value(row), table.get_value(row))
+
+        if hasattr(table, "has_data"):
+            for value in self.conditional["a"]:
+                self.assertEqual(bool(loaded.has_data({"a": value})), bool(table.has_data({"a": value})))
+
+    def test_round_trip(self):
+        for table in self.make_tables():
+            file_name = os.path.join(self.directory, type(table).__name__ + ".npz")
+            save_table(table, file_name)
+
+            self.assert_same(table, load_table(file_name))
+
+    def test_round_trip_memory_mapped(self):
+        for table in self.make_tables():
+            file_name = os.path.join(self.directory, type(table).__name__ + ".npz")
+            save_table(table, file_name)
+
+            loaded = load_table(file_name, mmap_mode="r")
+            self.assert_same(table, loaded)
+
+            if isinstance(table, (FlatFullTable, DenseTable)):
+                self.assertIsInstance(loaded.table, np.memmap)
+
+    def test_file_name_without_extension(self):
+        table = self.make_tables()[1]
+        file_name = os.path.join(self.directory, "table.dat")
+        save_table(table, file_name)
+
+        self.assertTrue(os.path.exists(file_name + ".npz"))
+        self.assert_same(table, load_table(file_name, mmap_mode="r"))
+
+
+if __name__ == '__main__':
+    unittest.main()
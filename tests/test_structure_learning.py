@@ -0,0 +1,118 @@
+__author__ = 'Dennis'
+
+import itertools
+import math
+import multiprocessing
+import random
+import unittest
+
+from easl.mechanisms.structure_learning import SufficientStatistics
+from easl.mechanisms.structure_learning import StructureLearner
+from easl.mechanisms.structure_learning import _chi_square_survival
+from easl.mechanisms.structure_learning import _independence_p_value
+
+
+class IndependenceTest(unittest.TestCase):
+    def test_chi_square_survival(self):
+        # With two degrees of freedom the survival function is exp(-x/2)
+        for x in [0.5, 2.0, 10.0]:
+            self.assertAlmostEqual(_chi_square_survival(x, 2), math.exp(-x / 2), places=9)
+
+        # Critical values at the 5% level, on both sides of x = a + 1
+        self.assertAlmostEqual(_chi_square_survival(3.841459, 1), 0.05, places=6)
+        self.assertAlmostEqual(_chi_square_survival(18.307038, 10), 0.05, places=6)
+        self.assertEqual(_chi_square_survival(0.0, 3), 1.0)
+
+    def test_independent_and_dependent_variables(self):
+        # x and y independent: the counts are the product of the marginals
+        counts = {("a", "p"): 20, ("a", "q"): 60, ("b", "p"): 10, ("b", "q"): 30}
+        self.assertAlmostEqual(_independence_p_value((counts, 0, 1)), 1.0)
+
+        counts = {("a", "p"): 45, ("a", "q"): 5, ("b", "p"): 5, ("b", "q"): 45}
+        self.assertLess(_independence_p_value((counts, 0, 1)), 1e-6)
+
+    def test_conditional_independence(self):
+        # x and y only depend on each other through z
+        counts = {}
+        for z, (same, other) in [("0", (40, 10)), ("1", (10, 40))]:
+            for x, y in itertools.product("ab", "ab"):
+                counts[(x, y, z)] = (same if x == "a" else other) * (same if y == "a" else other)
+
+        self.assertLess(_independence_p_value((self.__marginal(counts, 2), 0, 1)), 1e-6)
+        self.assertAlmostEqual(_independence_p_value((counts, 0, 1)), 1.0)
+
+        # Values of z that do not vary x or y add no degrees of freedom
+        counts = {("a", "p", "0"): 10, ("b", "p", "1"): 10}
+        self.assertEqual(_independence_p_value((counts, 0, 1)), 1.0)
+
+    @staticmethod
+    def __marginal(counts, i):
+        marginal = {}
+        for key, n in counts.iteritems():
+            key = key[:i] + key[i + 1:]
+            marginal[key] = marginal.get(key, 0) + n
+
+        return marginal
+
+
+class StructureLearnerTest(unittest.TestCase):
+    """
+    Data of x -> z <- y and z -> w, with z mostly the sum of x and y and w
+    mostly equal to z.
+    """
+    variables = {"x": ["0", "1"], "y": ["0", "1"], "z": ["0", "1", "2"], "w": ["0", "1", "2"]}
+    numbering = {"x": 1, "y": 2, "z": 3, "w": 4}
+
+    def setUp(self):
+        rng = random.Random(0)
+
+        self.statistics = SufficientStatistics(self.variables, [])
+        for _ in range(2000):
+            x = rng.choice(self.variables["x"])
+            y = rng.choice(self.variables["y"])
+            z = str(int(x) + int(y)) if rng.random() < 0.9 else rng.choice(self.variables["z"])
+            w = z if rng.random() < 0.8 else rng.choice(self.variables["w"])
+
+            self.statistics.add_entry({"x": x, "y": y, "z": z, "w": w})
+
+    def assert_graph(self, learner):
+        self.assertEqual(learner.skeleton, {frozenset("xz"), frozenset("yz"), frozenset("zw")})
+        self.assertEqual(learner.sepsets[frozenset("xy")], ())
+        self.assertIn("z", learner.sepsets[frozenset("xw")])
+        self.assertIn("z", learner.sepsets[frozenset("yw")])
+
+        # The collider is oriented by the separating sets, the rest by the numbering
+        self.assertEqual(sorted(learner.graph.get_edges()), [("x", "z"), ("y", "z"), ("z", "w")])
+
+    def test_learns_graph(self):
+        learner = StructureLearner(self.statistics, {}, self.numbering)
+        learner.learn()
+
+        self.assert_graph(learner)
+
+    def test_orients_collider_against_numbering(self):
+        # Without the collider, z -- x would point from z to x
+        numbering = {"z": 1, "w": 2, "x": 3, "y": 4}
+        learner = StructureLearner(self.statistics, {}, numbering)
+        graph = learner.learn()
+
+        self.assertTrue(graph.has_edge("x", "z"))
+        self.assertTrue(graph.has_edge("y", "z"))
+        self.assertTrue(graph.has_edge("z", "w"))
+
+    def test_orients_by_tiers(self):
+        tiers = {"w": 0, "x": 1, "y": 1, "z": 1}
+        graph = StructureLearner(self.statistics, tiers, self.numbering).learn()
+
+        self.assertTrue(graph.has_edge("w", "z"))
+
+    def test_process_pool_is_closed(self):
+        learner = StructureLearner(self.statistics, {}, self.numbering, processes=2)
+        learner.learn()
+
+        self.assert_graph(learner)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()